@@ -26,12 +26,210 @@ impl std::fmt::Display for BFError {
 
 impl std::error::Error for BFError {}
 
+/// A decoded Brainfuck command. Source text is decoded once up front, so the
+/// interpreter dispatches on a small opcode, comment characters never reach
+/// the run loop, and a run of `>`, `<` or `+`/`-` is a single instruction.
+#[derive(Debug, Clone, Copy, PartialEq)]
+enum Op {
+    /// Move right by the count, then add to the cell arrived at (so a move
+    /// and the change after it are one dispatch; 0 for a bare move).
+    Right(u32, u8),
+    Left(u32, u8),
+    /// Net change to the cell, wrapping (so `-` is `Add(255)`).
+    Add(u8),
+    Output,
+    Input,
+    Open,
+    Close,
+    /// `[-]` or `[+]`, stored at the `[`: zero the cell and skip the loop.
+    Clear,
+    /// A clear followed by a `+`/`-` run, stored at the `[`: set the cell to
+    /// the run's value and skip both.
+    Set(u8),
+    /// `[->+<]` and friends, stored at the `[`: add the cell to the one at
+    /// the given offset, zero it and skip the loop.
+    AddTo(i32),
+    /// `[->++>+++<<]` and other transfers to several cells or by a factor,
+    /// stored at the `[`: the loop's `(offset, factor)` pairs are the given
+    /// number of entries from the given index of the transfer table.
+    MulAdd(u32, u8),
+    /// `[>]` and `[<]`, stored at the `[`: move to the nearest zero cell in
+    /// that direction with a slice search rather than one step at a time.
+    ScanRight,
+    ScanLeft,
+}
+
+impl Op {
+    fn decode(byte: u8) -> Option<Op> {
+        match byte {
+            b'>' => Some(Op::Right(1, 0)),
+            b'<' => Some(Op::Left(1, 0)),
+            b'+' => Some(Op::Add(1)),
+            b'-' => Some(Op::Add(255)),
+            b'.' => Some(Op::Output),
+            b',' => Some(Op::Input),
+            b'[' => Some(Op::Open),
+            b']' => Some(Op::Close),
+            _ => None,
+        }
+    }
+
+    fn as_char(self) -> char {
+        match self {
+            Op::Right(..) => '>',
+            Op::Left(..) => '<',
+            Op::Add(n) if n > 128 => '-',
+            Op::Add(_) => '+',
+            Op::Output => '.',
+            Op::Input => ',',
+            Op::Open | Op::Clear | Op::Set(_) | Op::AddTo(_) | Op::MulAdd(..) | Op::ScanRight | Op::ScanLeft => '[',
+            Op::Close => ']',
+        }
+    }
+}
+
+/// Decode the eight commands from the source bytes, coalescing runs and
+/// folding the `+`/`-` run after a move into the move. The commands are all
+/// ASCII and UTF-8 continuation bytes never collide with them, so there is
+/// no need to decode characters first. `>` and `<` are not netted against
+/// each other, since `<` stops at the first cell.
+fn decode(code: &str) -> Vec<Op> {
+    let mut ops: Vec<Op> = Vec::new();
+    for op in code.bytes().filter_map(Op::decode) {
+        match (ops.last_mut(), op) {
+            (Some(Op::Right(n, 0)), Op::Right(..)) | (Some(Op::Left(n, 0)), Op::Left(..)) => *n += 1,
+            (Some(Op::Right(_, d) | Op::Left(_, d) | Op::Add(d)), Op::Add(m)) => {
+                *d = d.wrapping_add(m);
+                if ops.last() == Some(&Op::Add(0)) {
+                    ops.pop();
+                }
+            }
+            _ => ops.push(op),
+        }
+    }
+    ops
+}
+
+/// Pair up brackets: `jumps[i]` is the index of the bracket matching the one
+/// at `i` (other entries are unused), so loops jump in O(1).
+fn build_jumps(code: &[Op]) -> Result<Vec<u32>, BFError> {
+    let mut jumps = vec![0u32; code.len()];
+    let mut open = Vec::new();
+    for (i, op) in code.iter().enumerate() {
+        match op {
+            Op::Open => open.push(i),
+            Op::Close => {
+                let start = open
+                    .pop()
+                    .ok_or_else(|| BFError::BracketMismatch("Unmatched ]".to_string()))?;
+                jumps[start] = i as u32;
+                jumps[i] = start as u32;
+            }
+            _ => {}
+        }
+    }
+    if !open.is_empty() {
+        return Err(BFError::BracketMismatch("Unmatched [".to_string()));
+    }
+    Ok(jumps)
+}
+
+/// The effect of a loop body made only of moves and additions that ends
+/// where it started and steps the start cell by one per pass: the other
+/// cells it changes, each with what it adds to them per unit of the start
+/// cell's value. `None` if the body has any other shape, or wanders past
+/// the cells it changes (so running it could grow the tape).
+fn transfer_targets(body: &[Op]) -> Option<Vec<(i32, u8)>> {
+    let mut changes: Vec<(i32, u8)> = Vec::new();
+    let (mut offset, mut lowest, mut highest) = (0i32, 0i32, 0i32);
+    for &op in body {
+        let delta = match op {
+            Op::Right(n, delta) => {
+                offset = offset.checked_add(i32::try_from(n).ok()?)?;
+                delta
+            }
+            Op::Left(n, delta) => {
+                offset = offset.checked_sub(i32::try_from(n).ok()?)?;
+                delta
+            }
+            Op::Add(delta) => delta,
+            _ => return None,
+        };
+        (lowest, highest) = (lowest.min(offset), highest.max(offset));
+        match changes.iter_mut().find(|(at, _)| *at == offset) {
+            Some((_, total)) => *total = total.wrapping_add(delta),
+            None => changes.push((offset, delta)),
+        }
+    }
+    if offset != 0 {
+        return None;
+    }
+    let start = changes.iter().position(|&(at, _)| at == 0)?;
+    // Counting down runs the body `v` times; counting up runs it `256 - v`
+    // times, which adds the negated factors
+    let negate = match changes.remove(start).1 {
+        255 => false,
+        1 => true,
+        _ => return None,
+    };
+    changes.retain(|&(_, factor)| factor != 0);
+    if negate {
+        for (_, factor) in &mut changes {
+            *factor = factor.wrapping_neg();
+        }
+    }
+    let (low, high) = changes.iter().fold((0, 0), |(low, high), &(at, _)| (low.min(at), high.max(at)));
+    if lowest < low || highest > high {
+        return None;
+    }
+    Some(changes)
+}
+
+/// Replace the `[` of loops matching a known idiom with a single opcode that
+/// does the loop's work at once, returning the transfer table `MulAdd`
+/// opcodes index into. The body is left in place (so jump targets and `pc`
+/// positions are unchanged) and is only run if the fused opcode cannot
+/// handle the loop itself.
+fn fuse_loops(code: &mut [Op], jumps: &[u32]) -> Vec<(i32, u8)> {
+    let mut transfers = Vec::new();
+    for i in 0..code.len() {
+        if code[i] != Op::Open {
+            continue;
+        }
+        let body = &code[i + 1..jumps[i] as usize];
+        code[i] = match body {
+            [Op::Right(1, 0)] => Op::ScanRight,
+            [Op::Left(1, 0)] => Op::ScanLeft,
+            _ => match transfer_targets(body).as_deref() {
+                Some([]) => Op::Clear,
+                Some(&[(offset, 1)]) => Op::AddTo(offset),
+                Some(targets) if targets.len() <= u8::MAX as usize => {
+                    let start = transfers.len() as u32;
+                    transfers.extend_from_slice(targets);
+                    Op::MulAdd(start, targets.len() as u8)
+                }
+                _ => continue,
+            },
+        };
+        if let (Op::Clear, Some(&Op::Add(value))) = (code[i], code.get(jumps[i] as usize + 1)) {
+            code[i] = Op::Set(value);
+        }
+    }
+    transfers
+}
+
 pub struct BF {
     cells: Vec<u8>,
     ptr: usize,
-    code: Vec<char>,
+    code: Vec<Op>,
+    jumps: Vec<u32>,
+    /// `(offset, factor)` pairs of the fused `MulAdd` loops.
+    transfers: Vec<(i32, u8)>,
     pc: usize,
+    /// Everything printed by BF-mode `.` commands.
     output: Vec<u8>,
+    /// Bytes written to stdout that have not been flushed yet.
+    pending: Vec<u8>,
     mode: Mode,
     memory_limit: Option<usize>,
 }
@@ -48,9 +246,12 @@ impl BF {
         BF {
             cells,
             ptr: 0,
-            code: code.chars().collect(),
+            code: decode(code),
+            jumps: Vec::new(),
+            transfers: Vec::new(),
             pc: 0,
             output: Vec::new(),
+            pending: Vec::new(),
             mode,
             memory_limit: None,
         }
@@ -61,9 +262,12 @@ impl BF {
         BF {
             cells,
             ptr: 0,
-            code: code.chars().collect(),
+            code: decode(code),
+            jumps: Vec::new(),
+            transfers: Vec::new(),
             pc: 0,
             output: Vec::new(),
+            pending: Vec::new(),
             mode,
             memory_limit: Some(limit),
         }
@@ -74,127 +278,210 @@ impl BF {
     }
 
     pub fn run(&mut self) -> Result<(), BFError> {
-        let mut depth: i32 = 0;
-        for c in self.code.iter() {
-            match c {
-                '[' => depth += 1,
-                ']' => {
-                    depth -= 1;
-                    if depth < 0 {
-                        return Err(BFError::BracketMismatch("Unmatched ]".to_string()));
-                    }
-                }
-                _ => {}
-            }
-        }
-        if depth != 0 {
-            return Err(BFError::BracketMismatch("Unmatched [".to_string()));
+        // Pair brackets and fuse idioms once per program: the fused opcodes
+        // no longer read as `[`, so this must not run again
+        if self.jumps.len() != self.code.len() {
+            self.jumps = build_jumps(&self.code)?;
+            self.transfers = fuse_loops(&mut self.code, &self.jumps);
         }
 
         while self.pc < self.code.len() {
-            let mut jump_was_performed = false;
-            
-            let res = match self.mode {
-                Mode::BFA => self.execute_bfa(&mut jump_was_performed),
-                Mode::BF => self.execute_bf(&mut jump_was_performed),
-            };
-            
+            // Pure tape and loop commands run without returning here; only
+            // `.` and `,` need I/O or a syscall
+            let mut res = self.run_core();
+            if res.is_ok() && self.pc < self.code.len() {
+                res = match self.mode {
+                    Mode::BFA => self.execute_bfa(),
+                    Mode::BF => self.execute_bf(),
+                };
+            }
+
             if let Err(e) = res {
+                let _ = self.flush_output();
                 // For debugging: print state on error
+                let around = self.ptr.saturating_sub(5)..self.ptr.saturating_add(5).min(self.cells.len());
                 eprintln!("\nError during execution: {}", e);
-                eprintln!("PC: {}, Instruction: '{}'", self.pc, self.code[self.pc]);
+                eprintln!("PC: {}, Instruction: '{}'", self.pc, self.code[self.pc].as_char());
                 eprintln!("Pointer: {}", self.ptr);
-                eprintln!("Cells around pointer: {:?}", &self.cells[self.ptr.saturating_sub(5)..self.ptr.saturating_add(5)]);
+                eprintln!("Cells around pointer: {:?}", &self.cells[around]);
                 return Err(e);
             }
-            
-            // Only increment PC if no jump was performed
-            if !jump_was_performed {
-                self.pc += 1;
+
+            self.pc += 1;
+        }
+        self.flush_output()
+    }
+
+    /// Record `len` cells starting at `start` as written to stdout. Output is
+    /// written out per line (or every 4 KiB) rather than once per command.
+    /// Only BF-mode output is also kept in `output`; BFA writes are dropped
+    /// once flushed, so a long-running program doesn't grow without bound.
+    fn buffer_output(&mut self, start: usize, len: usize) -> Result<(), BFError> {
+        let bytes = &self.cells[start..start + len];
+        if self.mode == Mode::BF {
+            // `.` prints the cell as a character, so bytes >= 128 go out
+            // UTF-8 encoded; `output` keeps the raw cell values
+            self.output.extend_from_slice(bytes);
+            for &byte in bytes {
+                let mut utf8 = [0; 2];
+                self.pending.extend_from_slice((byte as char).encode_utf8(&mut utf8).as_bytes());
             }
+        } else {
+            self.pending.extend_from_slice(bytes);
+        }
+        let newline = bytes.contains(&b'\n');
+        if newline || self.pending.len() >= 4096 {
+            self.flush_output()?;
         }
         Ok(())
     }
-    
-    fn execute_bf(&mut self, jump_was_performed: &mut bool) -> Result<(), BFError> {
-        match self.code[self.pc] {
-            '>' => {
-                self.ptr = self.ptr.wrapping_add(1);
-                if self.ptr >= self.cells.len() {
-                    if let Some(limit) = self.memory_limit {
-                        if self.ptr >= limit {
-                            return Err(BFError::MemoryAccess("Memory limit exceeded".to_string()));
+
+    /// Write the pending output to stdout in one go.
+    fn flush_output(&mut self) -> Result<(), BFError> {
+        if self.pending.is_empty() {
+            return Ok(());
+        }
+        let mut stdout = std::io::stdout().lock();
+        stdout
+            .write_all(&self.pending)
+            .and_then(|_| stdout.flush())
+            .map_err(|e| BFError::SyscallFailed(e.to_string()))?;
+        self.pending.clear();
+        Ok(())
+    }
+
+    /// Execute commands from `pc` with the pointer and program counter held in
+    /// locals, stopping at the end of the program or at an I/O command, which
+    /// is left at `pc` for the caller.
+    fn run_core(&mut self) -> Result<(), BFError> {
+        let code = &self.code;
+        let jumps = &self.jumps;
+        let transfers = &self.transfers;
+        let cells = &mut self.cells;
+        let mut pc = self.pc;
+        let mut ptr = self.ptr;
+        let mut res = Ok(());
+
+        while pc < code.len() {
+            match code[pc] {
+                Op::Right(n, delta) => {
+                    let target = ptr + n as usize;
+                    if target >= cells.len() {
+                        if let Some(limit) = self.memory_limit {
+                            if target >= limit {
+                                res = Err(BFError::MemoryAccess("Memory limit exceeded".to_string()));
+                                break;
+                            }
                         }
+                        cells.resize(target + 1024, 0); // Auto-grow memory
                     }
-                    self.cells.resize(self.ptr + 1024, 0); // Auto-grow memory
+                    ptr = target;
+                    cells[ptr] = cells[ptr].wrapping_add(delta);
                 }
-            }
-            '<' => {
-                if self.ptr > 0 {
-                    self.ptr = self.ptr.wrapping_sub(1);
+                Op::Left(n, delta) => {
+                    ptr = ptr.saturating_sub(n as usize);
+                    cells[ptr] = cells[ptr].wrapping_add(delta);
                 }
-            }
-            '+' => self.cells[self.ptr] = self.cells[self.ptr].wrapping_add(1),
-            '-' => self.cells[self.ptr] = self.cells[self.ptr].wrapping_sub(1),
-            '.' => {
-                self.output.push(self.cells[self.ptr] as u8);
-                print!("{}", self.cells[self.ptr] as u8 as char);
-                std::io::stdout()
-                    .flush()
-                    .map_err(|e| BFError::SyscallFailed(e.to_string()))?;
-            }
-            ',' => {
-                let mut buf = [0u8; 1];
-                std::io::stdin()
-                    .read_exact(&mut buf)
-                    .map_err(|e| BFError::SyscallFailed(format!("Input failed: {}", e)))?;
-                self.cells[self.ptr] = buf[0] as u8;
-            }
-            '[' => {
-                if self.cells[self.ptr] == 0 {
-                    let mut loop_level = 1;
-                    while loop_level > 0 {
-                        self.pc += 1;
-                        if self.pc >= self.code.len() {
-                            return Err(BFError::BracketMismatch("Unmatched [".to_string()));
-                        }
-                        match self.code[self.pc] {
-                            '[' => loop_level += 1,
-                            ']' => loop_level -= 1,
-                            _ => {}
-                        }
+                Op::Add(n) => cells[ptr] = cells[ptr].wrapping_add(n),
+                Op::Open => {
+                    if cells[ptr] == 0 {
+                        pc = jumps[pc] as usize;
                     }
-                    *jump_was_performed = true;
                 }
-            }
-            ']' => {
-                if self.cells[self.ptr] != 0 {
-                    let mut loop_level = 1;
-                    while loop_level > 0 {
-                        if self.pc == 0 {
-                           return Err(BFError::BracketMismatch("Unmatched ]".to_string()));
-                        }
-                        self.pc -= 1;
-                        match self.code[self.pc] {
-                            '[' => loop_level -= 1,
-                            ']' => loop_level += 1,
-                            _ => {}
+                Op::Close => {
+                    if cells[ptr] != 0 {
+                        pc = jumps[pc] as usize;
+                    }
+                }
+                Op::Clear => {
+                    cells[ptr] = 0;
+                    pc = jumps[pc] as usize;
+                }
+                Op::Set(value) => {
+                    cells[ptr] = value;
+                    pc = jumps[pc] as usize + 1; // The `+`/`-` run after the loop
+                }
+                Op::AddTo(offset) => {
+                    let value = cells[ptr];
+                    let target = ptr.wrapping_add_signed(offset as isize);
+                    if value == 0 {
+                        pc = jumps[pc] as usize;
+                    } else if target < cells.len() {
+                        cells[target] = cells[target].wrapping_add(value);
+                        cells[ptr] = 0;
+                        pc = jumps[pc] as usize;
+                    }
+                    // Otherwise the target is off the tape: run the body
+                    // itself so it grows the tape (or fails) as usual
+                }
+                Op::MulAdd(start, len) => {
+                    let value = cells[ptr];
+                    let targets = &transfers[start as usize..][..len as usize];
+                    let on_tape = |&(offset, _): &(i32, u8)| {
+                        ptr.checked_add_signed(offset as isize).is_some_and(|t| t < cells.len())
+                    };
+                    if value == 0 {
+                        pc = jumps[pc] as usize;
+                    } else if targets.iter().all(on_tape) {
+                        for &(offset, factor) in targets {
+                            let target = ptr.wrapping_add_signed(offset as isize);
+                            cells[target] = cells[target].wrapping_add(value.wrapping_mul(factor));
                         }
+                        cells[ptr] = 0;
+                        pc = jumps[pc] as usize;
+                    }
+                    // As for AddTo, a target off either end runs the body
+                }
+                Op::ScanRight => match cells[ptr..].iter().position(|&c| c == 0) {
+                    Some(n) => {
+                        ptr += n;
+                        pc = jumps[pc] as usize;
+                    }
+                    // Every cell to the end is non-zero: step off the end
+                    // through the body, which grows the tape (or fails)
+                    None => ptr = cells.len() - 1,
+                },
+                Op::ScanLeft => {
+                    // With no zero cell to the left the loop never ends, as
+                    // `<` stops at the first cell; leave that to the body
+                    if let Some(n) = cells[..=ptr].iter().rposition(|&c| c == 0) {
+                        ptr = n;
+                        pc = jumps[pc] as usize;
                     }
-                    *jump_was_performed = true;
                 }
-                // Debug: print pointer and cell value after each loop iteration
-                // eprintln!("[BF DEBUG] After loop: ptr={}, cell[ptr]={}", self.ptr, self.cells[self.ptr]);
+                Op::Output | Op::Input => break,
+            }
+            pc += 1;
+        }
+
+        self.pc = pc;
+        self.ptr = ptr;
+        res
+    }
+
+    /// Execute the I/O command at `pc`.
+    fn execute_bf(&mut self) -> Result<(), BFError> {
+        match self.code[self.pc] {
+            Op::Output => {
+                self.buffer_output(self.ptr, 1)?;
+            }
+            Op::Input => {
+                // Make sure any prompt is visible before blocking on input
+                self.flush_output()?;
+                // Read straight into the current cell
+                std::io::stdin()
+                    .read_exact(std::slice::from_mut(&mut self.cells[self.ptr]))
+                    .map_err(|e| BFError::SyscallFailed(format!("Input failed: {}", e)))?;
             }
-            _ => {}, // Ignore other characters
+            _ => {}
         }
         Ok(())
     }
 
 
-    fn execute_bfa(&mut self, jump_was_performed: &mut bool) -> Result<(), BFError> {
+    fn execute_bfa(&mut self) -> Result<(), BFError> {
         match self.code[self.pc] {
-            '.' => {
+            Op::Output => {
                 // Syscall Convention:
                 // cell[0]: return value
                 // cell[1-6]: arguments
@@ -210,46 +497,64 @@ impl BF {
                     self.cells[6] as usize,
                 ];
 
-                self.validate_syscall(syscall_num as u32, &args)?;
+                // Consecutive writes to stdout are coalesced; anything else
+                // must observe them first
+                let stdout_write = syscall_num == SYS_WRITE as u8 && args[0] == 1;
+                if !stdout_write {
+                    self.flush_output()?;
+                }
 
-                let result = unsafe {
-                    match syscall_num {
-                        x if x == SYS_WRITE as u8 => {
-                            let fd = args[0];
-                            let buf_ptr = self.cells.as_ptr().add(args[1]);
-                            let count = args[2];
-                            syscalls::syscall!(Sysno::write, fd, buf_ptr, count)
-                        }
-                        x if x == SYS_READ as u8 => {
-                            let fd = args[0];
-                            let buf_ptr = self.cells.as_mut_ptr().add(args[1]);
-                            let count = args[2];
-                            syscalls::syscall!(Sysno::read, fd, buf_ptr, count)
-                        }
-                        x if x == SYS_SOCKET as u8 => {
-                            syscalls::syscall!(Sysno::socket, args[0], args[1], args[2])
-                        }
-                        x if x == SYS_BIND as u8 => {
-                            let fd = args[0];
-                            let sockaddr_ptr = self.cells.as_ptr().add(args[1]);
-                            let len = args[2];
-                            syscalls::syscall!(Sysno::bind, fd, sockaddr_ptr, len)
+                // Bounds checks and dispatch share one match on the number
+                let result = match syscall_num {
+                    _ if stdout_write => {
+                        // The program is told every byte was written: the
+                        // flush retries short writes, and an error there
+                        // (EPIPE, EBADF) ends the run as SyscallFailed instead
+                        // of reaching cell 0
+                        let (buf_addr, count) = (args[1], args[2]);
+                        self.check_buffer(syscall_num, buf_addr, count)?;
+                        self.buffer_output(buf_addr, count)?;
+                        Ok(count)
+                    }
+                    x if x == SYS_WRITE as u8 => {
+                        let (fd, buf_addr, count) = (args[0], args[1], args[2]);
+                        self.check_buffer(syscall_num, buf_addr, count)?;
+                        unsafe { syscalls::syscall!(Sysno::write, fd, self.cells.as_ptr().add(buf_addr), count) }
+                    }
+                    x if x == SYS_READ as u8 => {
+                        let (fd, buf_addr, count) = (args[0], args[1], args[2]);
+                        self.check_buffer(syscall_num, buf_addr, count)?;
+                        unsafe { syscalls::syscall!(Sysno::read, fd, self.cells.as_mut_ptr().add(buf_addr), count) }
+                    }
+                    x if x == SYS_SOCKET as u8 => unsafe {
+                        syscalls::syscall!(Sysno::socket, args[0], args[1], args[2])
+                    },
+                    x if x == SYS_BIND as u8 => {
+                        let (fd, sockaddr_addr, len) = (args[0], args[1], args[2]);
+                        if !self.in_bounds(sockaddr_addr, len) {
+                            return Err(BFError::MemoryAccess("sockaddr access out of bounds for bind".to_string()));
                         }
-                        x if x == SYS_LISTEN as u8 => {
-                            syscalls::syscall!(Sysno::listen, args[0], args[1])
+                        unsafe { syscalls::syscall!(Sysno::bind, fd, self.cells.as_ptr().add(sockaddr_addr), len) }
+                    }
+                    x if x == SYS_LISTEN as u8 => unsafe {
+                        syscalls::syscall!(Sysno::listen, args[0], args[1])
+                    },
+                    x if x == SYS_ACCEPT as u8 => {
+                        let (fd, sockaddr_addr, len_addr) = (args[0], args[1], args[2]);
+                        if !self.in_bounds(sockaddr_addr, 1) || !self.in_bounds(len_addr, 1) {
+                            return Err(BFError::MemoryAccess("Pointer argument out of bounds for accept".to_string()));
                         }
-                        x if x == SYS_ACCEPT as u8 => {
-                            let fd = args[0];
-                            let sockaddr_ptr = self.cells.as_mut_ptr().add(args[1]);
-                            let len_ptr = self.cells.as_mut_ptr().add(args[2]);
+                        unsafe {
+                            let sockaddr_ptr = self.cells.as_mut_ptr().add(sockaddr_addr);
+                            let len_ptr = self.cells.as_mut_ptr().add(len_addr);
                             syscalls::syscall!(Sysno::accept, fd, sockaddr_ptr, len_ptr)
                         }
-                        x if x == SYS_CLOSE as u8 => {
-                            syscalls::syscall!(Sysno::close, args[0])
-                        }
-                        _ => {
-                            return Err(BFError::InvalidSyscall(format!("Unsupported syscall number: {}", syscall_num)));
-                        }
+                    }
+                    x if x == SYS_CLOSE as u8 => unsafe {
+                        syscalls::syscall!(Sysno::close, args[0])
+                    },
+                    _ => {
+                        return Err(BFError::InvalidSyscall(format!("Unsupported syscall number: {}", syscall_num)));
                     }
                 };
 
@@ -266,41 +571,18 @@ impl BF {
                     }
                 }
             }
-            _ => self.execute_bf(jump_was_performed),
+            _ => self.execute_bf(),
         }
     }
 
-    fn validate_syscall(&self, syscall_num: u32, args: &[usize; 6]) -> Result<(), BFError> {
-        let max_addr = self.cells.len();
+    /// Whether `len` cells starting at `addr` lie inside the tape.
+    fn in_bounds(&self, addr: usize, len: usize) -> bool {
+        addr.saturating_add(len) <= self.cells.len()
+    }
 
-        match syscall_num {
-            // write, read
-            x if x == SYS_WRITE as u32 || x == SYS_READ as u32 => {
-                let buf_addr = args[1];
-                let count = args[2];
-                if buf_addr.saturating_add(count) > max_addr {
-                    return Err(BFError::MemoryAccess(format!("Buffer access out of bounds for syscall {}", syscall_num)));
-                }
-            }
-            // bind
-            x if x == SYS_BIND as u32 => {
-                let sockaddr_addr = args[1];
-                let len = args[2];
-                if sockaddr_addr.saturating_add(len) > max_addr {
-                    return Err(BFError::MemoryAccess("sockaddr access out of bounds for bind".to_string()));
-                }
-            }
-            // accept
-            x if x == SYS_ACCEPT as u32 => {
-                 let sockaddr_addr = args[1];
-                 let len_addr = args[2];
-                 if sockaddr_addr >= max_addr || len_addr >= max_addr {
-                     return Err(BFError::MemoryAccess("Pointer argument out of bounds for accept".to_string()));
-                 }
-            }
-            // socket, listen, close
-            x if x == SYS_SOCKET as u32 || x == SYS_LISTEN as u32 || x == SYS_CLOSE as u32 => {}
-            _ => {} // Let the syscall fail for unknown numbers
+    fn check_buffer(&self, syscall_num: u8, buf_addr: usize, count: usize) -> Result<(), BFError> {
+        if !self.in_bounds(buf_addr, count) {
+            return Err(BFError::MemoryAccess(format!("Buffer access out of bounds for syscall {}", syscall_num)));
         }
         Ok(())
     }
@@ -322,6 +604,104 @@ mod tests {
         assert_eq!(String::from_utf8(bf.output).unwrap(), "Hello World!\n");
     }
 
+    #[test]
+    fn test_bracket_mismatch() {
+        for code in ["+[>+<-", "+]", "[]]["] {
+            let mut bf = BF::new(code, Mode::BF);
+            assert!(matches!(bf.run(), Err(BFError::BracketMismatch(_))), "{}", code);
+        }
+    }
+
+    #[test]
+    fn test_fused_loops() {
+        // Clear, transfer right, transfer left, and a transfer to a cell
+        // past the end of the tape, which falls back to running the loop
+        let mut bf = BF::new("+++[-]>+++++[->>+<<]>>[<+>-]>>++[->+<]", Mode::BF);
+        bf.cells.truncate(6);
+        bf.run().unwrap();
+        assert_eq!(bf.dump_cells(7), &[0, 0, 5, 0, 0, 0, 2]);
+        assert_eq!(bf.code[0], Op::Add(3));
+        assert!(matches!(bf.code[1], Op::Clear));
+        assert_eq!(bf.code[4], Op::Right(1, 5));
+        assert!(matches!(bf.code[5], Op::AddTo(2)));
+
+        // A clear and the change after it are one store
+        let mut bf = BF::new("+++[-]-->[-]", Mode::BF);
+        bf.run().unwrap();
+        assert_eq!(bf.dump_cells(2), &[254, 0]);
+        assert!(matches!(bf.code[1], Op::Set(254)));
+        assert!(matches!(bf.code[6], Op::Clear));
+    }
+
+    #[test]
+    fn test_multiply_loops() {
+        // Two factors at once, a count up from 5 (251 passes), and a
+        // target past the end of the tape, which falls back to the body
+        let mut bf = BF::new("+++[->++>+++<<]>>>+++++[+>+<]>>++[->++>+<<]", Mode::BF);
+        bf.cells.truncate(7);
+        bf.run().unwrap();
+        assert_eq!(bf.dump_cells(8), &[0, 6, 9, 0, 251, 0, 4, 2]);
+        assert!(matches!(bf.code[1], Op::MulAdd(0, 2)));
+        assert!(matches!(bf.code[8], Op::MulAdd(2, 1)));
+        assert_eq!(&bf.transfers[..3], &[(1, 2), (2, 3), (1, 255)]);
+    }
+
+    #[test]
+    fn test_scan_loops() {
+        // Scan back left to the zero at cell 1, then right to cell 5
+        let mut bf = BF::new("+>>+>+>+[<]+[>]+", Mode::BF);
+        bf.run().unwrap();
+        assert_eq!(bf.dump_cells(7), &[1, 1, 1, 1, 1, 1, 0]);
+        assert!(matches!(bf.code[4], Op::ScanLeft));
+        assert!(matches!(bf.code[8], Op::ScanRight));
+
+        // A scan right on a tape with no zero cell grows the tape
+        let mut bf = BF::new("+>+<[>]+", Mode::BF);
+        bf.cells.truncate(2);
+        bf.run().unwrap();
+        assert_eq!(bf.dump_cells(3), &[1, 1, 1]);
+    }
+
+    #[test]
+    fn test_run_again_after_fusing() {
+        let mut bf = BF::new("++[->+<]", Mode::BF);
+        bf.run().unwrap();
+        bf.run().unwrap();
+        assert_eq!(bf.dump_cells(2), &[0, 2]);
+    }
+
+    #[test]
+    fn test_bf_output_prints_cells_as_characters() {
+        let mut bf = BF::new(".", Mode::BF);
+        bf.cells[0] = 200;
+        bf.execute_bf().unwrap();
+        assert_eq!(bf.pending, "\u{c8}".as_bytes());
+        assert_eq!(bf.output, &[200]);
+    }
+
+    #[test]
+    fn test_bfa_stdout_writes_are_buffered() {
+        // Two write(1, &cells[10], 2) syscalls
+        let mut bf = BF::new("..", Mode::BFA);
+        bf.cells[7] = SYS_WRITE as u8;
+        bf.cells[1] = 1;
+        bf.cells[2] = 10;
+        bf.cells[3] = 2;
+        bf.cells[10] = b'h';
+        bf.cells[11] = b'i';
+        for pc in 0..2 {
+            bf.pc = pc;
+            bf.execute_bfa().unwrap();
+        }
+        assert_eq!(bf.pending, b"hihi");
+        // Flushed at the end of the run, and not kept afterwards
+        bf.pc = 2;
+        bf.run().unwrap();
+        assert!(bf.pending.is_empty());
+        assert!(bf.output.is_empty());
+        assert_eq!(bf.cells[0], 2);
+    }
+
     #[test]
     fn test_bfa_write() {
         // This test verifies the syscall interface works correctly
@@ -1,5 +1,9 @@
+use std::borrow::Cow;
+use std::cell::OnceCell;
 use std::collections::HashMap;
 
+use crate::syscall_consts::SYS_WRITE;
+
 // Use cells closer to variables for better efficiency
 const SCRATCH_1: usize = 100;
 const SCRATCH_2: usize = 101; // Adjacent to SCRATCH_1 for efficient copying
@@ -19,11 +23,151 @@ pub enum BFLNode {
     Block(Vec<BFLNode>),
 }
 
+/// The value a `Number` literal leaves in its cell: the compiler emits `n`
+/// increments for positive literals and nothing for the rest.
+fn cell_value(n: i32) -> u8 {
+    if n > 0 {
+        n as u8
+    } else {
+        0
+    }
+}
+
+/// Constant-fold `Add`/`Sub` nodes whose operands are both numbers, using
+/// the same 8-bit wrapping arithmetic the generated code performs.
+pub fn fold_constants(node: &BFLNode) -> BFLNode {
+    fold(node).into_owned()
+}
+
+/// Fold `node`, borrowing every subtree that has nothing to fold so that
+/// only the path down to a folded node is copied.
+fn fold(node: &BFLNode) -> Cow<'_, BFLNode> {
+    match node {
+        BFLNode::Assign(name, expr) => match fold(expr) {
+            Cow::Borrowed(_) => Cow::Borrowed(node),
+            Cow::Owned(expr) => Cow::Owned(BFLNode::Assign(name.clone(), Box::new(expr))),
+        },
+        BFLNode::Add(lhs, rhs) => fold_binary(node, lhs, rhs, |a, b| a.wrapping_add(b), BFLNode::Add),
+        BFLNode::Sub(lhs, rhs) => fold_binary(node, lhs, rhs, |a, b| a.wrapping_sub(b), BFLNode::Sub),
+        BFLNode::If(cond, body) => fold_with_body(node, cond, body, BFLNode::If),
+        BFLNode::While(cond, body) => fold_with_body(node, cond, body, BFLNode::While),
+        BFLNode::Syscall(num, args) => fold_with_body(node, num, args, BFLNode::Syscall),
+        BFLNode::Block(statements) => match fold_all(statements) {
+            None => Cow::Borrowed(node),
+            Some(statements) => Cow::Owned(BFLNode::Block(statements)),
+        },
+        _ => Cow::Borrowed(node),
+    }
+}
+
+fn fold_binary<'a>(
+    node: &'a BFLNode,
+    lhs: &'a BFLNode,
+    rhs: &'a BFLNode,
+    eval: fn(u8, u8) -> u8,
+    rebuild: fn(Box<BFLNode>, Box<BFLNode>) -> BFLNode,
+) -> Cow<'a, BFLNode> {
+    let (lhs, rhs) = (fold(lhs), fold(rhs));
+    match (lhs.as_ref(), rhs.as_ref()) {
+        (BFLNode::Number(a), BFLNode::Number(b)) => {
+            Cow::Owned(BFLNode::Number(eval(cell_value(*a), cell_value(*b)) as i32))
+        }
+        _ if matches!((&lhs, &rhs), (Cow::Borrowed(_), Cow::Borrowed(_))) => Cow::Borrowed(node),
+        _ => Cow::Owned(rebuild(Box::new(lhs.into_owned()), Box::new(rhs.into_owned()))),
+    }
+}
+
+fn fold_with_body<'a>(
+    node: &'a BFLNode,
+    head: &'a BFLNode,
+    body: &'a [BFLNode],
+    rebuild: fn(Box<BFLNode>, Vec<BFLNode>) -> BFLNode,
+) -> Cow<'a, BFLNode> {
+    match (fold(head), fold_all(body)) {
+        (Cow::Borrowed(_), None) => Cow::Borrowed(node),
+        (head, folded) => Cow::Owned(rebuild(
+            Box::new(head.into_owned()),
+            folded.unwrap_or_else(|| body.to_vec()),
+        )),
+    }
+}
+
+/// The folded copy of `nodes`, or `None` if none of them had anything to fold.
+fn fold_all(nodes: &[BFLNode]) -> Option<Vec<BFLNode>> {
+    let folded: Vec<Cow<BFLNode>> = nodes.iter().map(fold).collect();
+    if folded.iter().all(|node| matches!(node, Cow::Borrowed(_))) {
+        return None;
+    }
+    Some(folded.into_iter().map(Cow::into_owned).collect())
+}
+
+/// One instruction of the compiler's flat intermediate form. Pointer moves
+/// and cell additions are signed counts, so a run of `>`/`<` or `+`/`-`
+/// commands is a single instruction however long it renders.
+#[derive(Debug, Clone, Copy, PartialEq)]
+enum Instr {
+    Move(isize),
+    Add(i32),
+    Open,
+    Close,
+    Output,
+    Input,
+    /// `[-]`: zero the current cell.
+    Clear,
+}
+
+impl Instr {
+    fn parse(op: char) -> Option<Instr> {
+        match op {
+            '>' => Some(Instr::Move(1)),
+            '<' => Some(Instr::Move(-1)),
+            '+' => Some(Instr::Add(1)),
+            '-' => Some(Instr::Add(-1)),
+            '[' => Some(Instr::Open),
+            ']' => Some(Instr::Close),
+            '.' => Some(Instr::Output),
+            ',' => Some(Instr::Input),
+            _ => None,
+        }
+    }
+
+    /// The number of Brainfuck commands this renders as.
+    fn len(&self) -> usize {
+        match *self {
+            Instr::Move(n) => n.unsigned_abs(),
+            Instr::Add(n) => n.unsigned_abs() as usize,
+            Instr::Clear => 3,
+            _ => 1,
+        }
+    }
+}
+
 pub struct BFLCompiler {
     variables: HashMap<String, usize>,
     next_var_location: usize,
-    output: String,
+    /// The program lowered to a flat instruction list. The text is only
+    /// materialized by `get_output`.
+    output: Vec<Instr>,
+    rendered: OnceCell<String>,
     current_ptr: usize,
+    /// The literal each syscall cell is known to hold at this point in
+    /// straight-line code, so repeated syscalls don't reload unchanged
+    /// arguments. Cells 1-7 are only written by `Syscall` nodes (the kernel
+    /// writes cell 0 and memory behind pointer arguments, which the compiler
+    /// never points below cell 8).
+    syscall_cells: [Option<u8>; 8],
+    /// Buffers known to hold a string or byte literal, so an identical
+    /// literal points at the existing copy instead of writing it again.
+    string_buffers: HashMap<Vec<u8>, usize>,
+    /// The value each variable cell is known to hold at this point, so
+    /// conditions that can only go one way are decided at compile time.
+    known_values: HashMap<usize, u8>,
+    /// Nesting depth inside a loop being dropped because it can never be
+    /// entered; everything up to its closing bracket is discarded.
+    dead_loops: usize,
+    /// How many `While` bodies the code being compiled is nested in. A cell
+    /// first allocated there is only untouched on the first iteration.
+    loop_depth: usize,
 }
 
 impl Default for BFLCompiler {
@@ -40,21 +184,180 @@ impl BFLCompiler {
         BFLCompiler {
             variables,
             next_var_location: 8, // Start user variables after syscall reserved area
-            output: String::new(),
+            output: Vec::new(),
+            rendered: OnceCell::new(),
             current_ptr: 0,
+            syscall_cells: [None; 8],
+            string_buffers: HashMap::new(),
+            known_values: HashMap::new(),
+            dead_loops: 0,
+            loop_depth: 0,
+        }
+    }
+
+    /// Append an instruction, merging it into the previous one when both
+    /// are moves or both are additions (and dropping the result if the two
+    /// cancel out), so the output never holds mergeable neighbours.
+    fn emit_instr(&mut self, instr: Instr) {
+        self.rendered.take();
+        if self.dead_loops > 0 {
+            match instr {
+                Instr::Open => self.dead_loops += 1,
+                Instr::Close => self.dead_loops -= 1,
+                _ => {}
+            }
+            return;
+        }
+        if instr == Instr::Open {
+            // A loop opened on a cell that was just cleared, just ended a
+            // loop, or was never touched is never entered. Its body starts
+            // and ends on that cell, so the pointer is where it was
+            if let None | Some(Instr::Clear | Instr::Close) = self.output.last() {
+                self.dead_loops = 1;
+                return;
+            }
+        }
+        if instr == Instr::Clear {
+            // A change to the cell right before clearing it is dead, and a
+            // cell that was just cleared (or just ended a loop) is zero
+            while let Some(Instr::Add(_)) = self.output.last() {
+                self.output.pop();
+            }
+            if let Some(Instr::Clear | Instr::Close) = self.output.last() {
+                return;
+            }
+        }
+        let merged = match (self.output.last(), instr) {
+            (Some(Instr::Move(a)), Instr::Move(b)) => Instr::Move(a + b),
+            (Some(Instr::Add(a)), Instr::Add(b)) => Instr::Add(a + b),
+            _ => {
+                self.output.push(instr);
+                return;
+            }
+        };
+        self.output.pop();
+        if merged != Instr::Move(0) && merged != Instr::Add(0) {
+            self.output.push(merged);
         }
     }
 
+    /// Zero the current cell.
+    fn emit_clear(&mut self) {
+        self.emit_instr(Instr::Clear);
+    }
+
+    /// Add `delta` to the current cell.
+    fn emit_add(&mut self, delta: i32) {
+        if delta != 0 {
+            self.emit_instr(Instr::Add(delta));
+        }
+    }
+
+    /// Append a short literal fragment such as `"-]"`.
+    fn emit(&mut self, code: &str) {
+        for instr in code.chars().filter_map(Instr::parse) {
+            self.emit_instr(instr);
+        }
+    }
+
+    /// Render the instruction list as Brainfuck text in a single pass. Every
+    /// command is one ASCII byte, so each move or addition is a single fill
+    /// of the buffer.
+    fn render(program: &[Instr]) -> String {
+        let mut code = Vec::with_capacity(program.iter().map(Instr::len).sum());
+        for instr in program {
+            match *instr {
+                Instr::Move(n) => code.resize(code.len() + instr.len(), if n < 0 { b'<' } else { b'>' }),
+                Instr::Add(n) => code.resize(code.len() + instr.len(), if n < 0 { b'-' } else { b'+' }),
+                Instr::Open => code.push(b'['),
+                Instr::Close => code.push(b']'),
+                Instr::Output => code.push(b'.'),
+                Instr::Input => code.push(b','),
+                Instr::Clear => code.extend_from_slice(b"[-]"),
+            }
+        }
+        String::from_utf8(code).expect("Brainfuck commands are ASCII")
+    }
+
+    /// Bump-allocate `len` consecutive cells. Allocations never overlap each
+    /// other, so the only thing to step around is the reserved scratch area.
+    fn allocate(&mut self, len: usize) -> usize {
+        let mut pos = self.next_var_location;
+        if pos <= SCRATCH_2 && pos + len > SCRATCH_1 {
+            pos = SCRATCH_2 + 1;
+        }
+        self.next_var_location = pos + len;
+        debug_assert!(pos >= 8, "allocation overlaps the syscall area");
+        debug_assert!(
+            pos > SCRATCH_2 || pos + len <= SCRATCH_1,
+            "allocation overlaps the scratch cells"
+        );
+        pos
+    }
+
+    /// Give back the cells of the latest allocation, if nothing has been
+    /// allocated since; they must be zero again, as `temp_cell` and later
+    /// allocations assume of cells past the end. Inside a `While` body they
+    /// are kept: a later allocation in the body would get them, and the next
+    /// iteration would clobber it by using them again.
+    fn release(&mut self, pos: usize, len: usize) {
+        if self.loop_depth == 0 && self.next_var_location == pos + len {
+            self.next_var_location = pos;
+        }
+    }
+
+    /// The cell holding `name`, allocating one on first use.
+    fn variable_location(&mut self, name: &str) -> usize {
+        if let Some(&loc) = self.variables.get(name) {
+            return loc;
+        }
+        let loc = self.allocate(1);
+        self.variables.insert(name.to_string(), loc);
+        if self.loop_depth == 0 {
+            self.known_values.insert(loc, 0); // Nothing has written it yet
+        }
+        loc
+    }
+
+    /// The cell holding `name`, which must already be assigned. The error
+    /// message is only formatted when the lookup fails.
+    fn existing_variable(&self, name: &str) -> Result<usize, String> {
+        self.variables
+            .get(name)
+            .copied()
+            .ok_or_else(|| format!("Variable '{}' not found", name))
+    }
+
+    /// A zero cell to use as the temporary when copying `src` to `dest`:
+    /// `SCRATCH_1`, or the first cell not yet allocated (nothing has written
+    /// it, and the copy leaves it zero again), whichever keeps the trips
+    /// between the three cells shorter. Inside a `While` body the free cell
+    /// may still be allocated later in the body, and the next iteration would
+    /// then clobber that variable, so only the scratch cells are used there.
+    fn temp_cell(&self, src: usize, dest: usize) -> usize {
+        let mut free = self.next_var_location;
+        if (SCRATCH_1..=SCRATCH_2).contains(&free) {
+            free = SCRATCH_2 + 1;
+        }
+        if self.loop_depth > 0 {
+            free = SCRATCH_2;
+        }
+        // The restoring loop runs src <-> temp, so that distance counts twice
+        // more than the one to dest
+        let cost = |temp: usize| temp.abs_diff(dest) + 3 * temp.abs_diff(src);
+        [SCRATCH_1, free]
+            .into_iter()
+            .filter(|&temp| temp != src && temp != dest)
+            .min_by_key(|&temp| cost(temp))
+            .expect("the free cell is never an operand")
+    }
+
     // A clean, simple, and correct pointer movement function.
     fn move_to(&mut self, target: usize) {
         if self.current_ptr == target {
             return;
         }
-        if target > self.current_ptr {
-            self.output.push_str(&">".repeat(target - self.current_ptr));
-        } else {
-            self.output.push_str(&"<".repeat(self.current_ptr - target));
-        }
+        self.emit_instr(Instr::Move(target as isize - self.current_ptr as isize));
         self.current_ptr = target;
     }
 
@@ -68,12 +371,12 @@ impl BFLCompiler {
         if src + 1 == dest {
             // src and dest are adjacent, src < dest
             self.move_to(src);
-            self.output.push_str("[->+<]");
+            self.emit("[->+<]");
             self.current_ptr = dest;
         } else if dest + 1 == src {
             // src and dest are adjacent, dest < src
             self.move_to(dest);
-            self.output.push_str("[->+<]");
+            self.emit("[->+<]");
             self.current_ptr = src;
         } else {
             // Not adjacent, fall back to general copy
@@ -91,16 +394,16 @@ impl BFLCompiler {
         
         // Clear destination
         self.move_to(dest);
-        self.output.push_str("[-]");
+        self.emit_clear();
         
         // Move value from src to dest
         self.move_to(src);
-        self.output.push_str("["); // while src is not zero
+        self.emit_instr(Instr::Open); // while src is not zero
         self.move_to(dest);
-        self.output.push('+'); // dest++
+        self.emit_add(1); // dest++
         self.move_to(src);
-        self.output.push('-'); // src--
-        self.output.push_str("]");
+        self.emit_add(-1); // src--
+        self.emit_instr(Instr::Close);
         
         // Ensure pointer ends at dest
         self.move_to(dest);
@@ -114,181 +417,257 @@ impl BFLCompiler {
             return;
         }
 
-        // 1. Clear destination and scratch cell
-        self.move_to(dest);
-        self.output.push_str("[-]");
-        self.move_to(SCRATCH_1);
-        self.output.push_str("[-]");
+        let temp = self.temp_cell(src, dest);
+
+        // 1. Clear destination and temp cell
+        self.clear_cell(dest);
+        self.move_to(temp);
+        self.emit_clear();
 
-        // 2. Move value from src to dest and scratch
+        // 2. Move value from src to dest and temp
         self.move_to(src);
-        self.output.push_str("["); // while src is not zero
+        self.emit_instr(Instr::Open); // while src is not zero
         self.move_to(dest);
-        self.output.push('+'); // dest++
-        self.move_to(SCRATCH_1);
-        self.output.push('+'); // scratch++
+        self.emit_add(1); // dest++
+        self.move_to(temp);
+        self.emit_add(1); // temp++
         self.move_to(src);
-        self.output.push('-'); // src--
-        self.output.push_str("]");
+        self.emit_add(-1); // src--
+        self.emit_instr(Instr::Close);
 
-        // 3. Restore value from scratch to src
-        self.move_to(SCRATCH_1);
-        self.output.push_str("["); // while scratch is not zero
+        // 3. Restore value from temp to src
+        self.move_to(temp);
+        self.emit_instr(Instr::Open); // while temp is not zero
         self.move_to(src);
-        self.output.push('+'); // src++
-        self.move_to(SCRATCH_1);
-        self.output.push('-'); // scratch--
-        self.output.push_str("]");
+        self.emit_add(1); // src++
+        self.move_to(temp);
+        self.emit_add(-1); // temp--
+        self.emit_instr(Instr::Close);
 
         // 4. Ensure pointer ends at dest
         self.move_to(dest);
     }
 
-    /// Advanced peephole optimizer to remove redundant sequences and optimize patterns
-    fn optimize_output(&mut self) {
-        let mut optimized = String::new();
-        let chars: Vec<char> = self.output.chars().collect();
-        let mut i = 0;
-        
-        while i < chars.len() {
-            // Remove redundant pointer movements: >< or <>
-            if i + 1 < chars.len() {
-                match (chars[i], chars[i + 1]) {
-                    ('>', '<') | ('<', '>') => {
-                        i += 2; // Skip both characters
-                        continue;
-                    }
-                    _ => {}
-                }
-            }
-            
-            // Remove redundant increments/decrements: +- or -+
-            if i + 1 < chars.len() {
-                match (chars[i], chars[i + 1]) {
-                    ('+', '-') | ('-', '+') => {
-                        i += 2; // Skip both characters
-                        continue;
-                    }
-                    _ => {}
-                }
-            }
-            
-            // Remove redundant loops: [][]
-            if i + 3 < chars.len() && chars[i] == '[' && chars[i + 1] == ']' && chars[i + 2] == '[' && chars[i + 3] == ']' {
-                i += 4; // Skip all four characters
-                continue;
-            }
-            
-            // Optimize clear cell followed by set: [-]+++++ -> [-]
-            if i + 2 < chars.len() && chars[i] == '[' && chars[i + 1] == '-' && chars[i + 2] == ']' {
-                optimized.push_str("[-]");
-                i += 3;
-                
-                // Skip any following + or - characters (they're redundant after clear)
-                while i < chars.len() && (chars[i] == '+' || chars[i] == '-') {
-                    i += 1;
-                }
-                continue;
-            }
-            
-            // Optimize multiple consecutive + or - into a single character
-            if chars[i] == '+' || chars[i] == '-' {
-                let op = chars[i];
-                let mut count = 0;
-                let mut j = i;
-                while j < chars.len() && chars[j] == op {
-                    count += 1;
-                    j += 1;
-                }
-                
-                // If we have more than 1 consecutive, optimize
-                if count > 1 {
-                    optimized.push_str(&op.to_string().repeat(count));
-                    i = j;
-                    continue;
-                }
-            }
-            
-            // Optimize multiple consecutive > or < into a single character
-            if chars[i] == '>' || chars[i] == '<' {
-                let op = chars[i];
-                let mut count = 0;
-                let mut j = i;
-                while j < chars.len() && chars[j] == op {
-                    count += 1;
-                    j += 1;
-                }
-                
-                // If we have more than 1 consecutive, optimize
-                if count > 1 {
-                    optimized.push_str(&op.to_string().repeat(count));
-                    i = j;
-                    continue;
-                }
-            }
-            
-            optimized.push(chars[i]);
-            i += 1;
+    /// The output with redundant `[][]` loop pairs removed.
+    fn optimized_text(&self) -> String {
+        let mut rest = self.get_output();
+        let mut optimized = String::with_capacity(rest.len());
+        while let Some(pos) = rest.find("[][]") {
+            optimized.push_str(&rest[..pos]);
+            rest = &rest[pos + 4..];
         }
-        
-        self.output = optimized;
+        optimized.push_str(rest);
+        optimized
+    }
+
+    fn optimize_output(&mut self) {
+        let optimized = self.optimized_text();
+        self.output = optimized.chars().filter_map(Instr::parse).collect();
+        self.rendered = OnceCell::from(optimized);
     }
 
     /// Return an optimized version of the output without modifying internal state
     pub fn get_optimized_output_copy(&self) -> String {
-        let mut optimized = String::new();
-        let chars: Vec<char> = self.output.chars().collect();
-        let mut i = 0;
-        
-        while i < chars.len() {
-            // Remove redundant pointer movements: >< or <>
-            if i + 1 < chars.len() {
-                match (chars[i], chars[i + 1]) {
-                    ('>', '<') | ('<', '>') => {
-                        i += 2; // Skip both characters
-                        continue;
-                    }
-                    _ => {}
-                }
+        self.optimized_text()
+    }
+
+    /// Cheapest `a * b + r == value` split for building `value` with a
+    /// multiply loop, or `None` if that is not shorter than `plain` commands
+    /// once `overhead` extra commands are paid.
+    fn multiply_split(value: usize, overhead: usize, plain: usize) -> Option<(usize, usize, usize)> {
+        (2..=value / 2)
+            .map(|a| (a, value / a, value % a))
+            .min_by_key(|&(a, b, r)| a + b + r)
+            .filter(|&(a, b, r)| a + b + r + overhead < plain)
+    }
+
+    /// Commands a multiply loop for `emit_constant` spends besides the `+`
+    /// runs: clearing the scratch cell, the loop brackets and decrement, and
+    /// four trips between the two cells.
+    fn multiply_overhead(scratch_distance: usize) -> usize {
+        6 + 4 * scratch_distance
+    }
+
+    /// Commands `emit_constant` spends adding `value` to a cleared cell with
+    /// a scratch cell `scratch_distance` away (not counting the move there).
+    fn constant_cost(value: u8, scratch_distance: usize) -> usize {
+        let plain = Self::shortest_delta(value).unsigned_abs() as usize;
+        let overhead = Self::multiply_overhead(scratch_distance);
+        Self::multiply_split(value as usize, overhead, plain).map_or(plain, |(a, b, r)| a + b + r + overhead)
+    }
+
+    /// Cheapest single loop that seeds every byte of a fresh buffer at once:
+    /// `n` turns of a counter, each adding `factors[i]` to cell `i`, so only
+    /// a short remainder per byte is left to add afterwards. Returns `n`,
+    /// the factors, and the commands spent beyond walking out to the
+    /// trailing counter cell and back, which building the bytes one by one
+    /// also costs.
+    fn shared_multiply(bytes: &[u8]) -> Option<(usize, Vec<usize>, usize)> {
+        (2..=16usize)
+            .filter_map(|n| {
+                let factors: Vec<usize> = bytes
+                    .iter()
+                    .map(|&byte| {
+                        (0..=255 / n)
+                            .min_by_key(|&m| m + Self::shortest_delta(byte.wrapping_sub((n * m) as u8)).unsigned_abs() as usize)
+                            .unwrap_or(0)
+                    })
+                    .collect();
+                // The loop body walks from the counter to the first seeded
+                // cell and back
+                let lowest = factors.iter().position(|&m| m > 0)?;
+                let adds: usize = bytes
+                    .iter()
+                    .zip(&factors)
+                    .map(|(&byte, &m)| m + Self::shortest_delta(byte.wrapping_sub((n * m) as u8)).unsigned_abs() as usize)
+                    .sum();
+                Some((n, factors, n + 3 + 2 * (bytes.len() - lowest) + adds))
+            })
+            .min_by_key(|&(_, _, cost)| cost)
+    }
+
+    /// The shorter way to add `value` to a cell without a loop: counting up,
+    /// or counting down past zero for values above 128.
+    fn shortest_delta(value: u8) -> i32 {
+        if value > 128 {
+            value as i32 - 256
+        } else {
+            value as i32
+        }
+    }
+
+    /// Whether a cell known to hold `old` gets to `new` in fewer commands by
+    /// adding the difference than by being cleared and counted up again.
+    fn delta_is_shorter(old: u8, new: u8) -> bool {
+        Self::shortest_delta(new.wrapping_sub(old)).unsigned_abs() < 3 + Self::shortest_delta(new).unsigned_abs()
+    }
+
+    /// Zero `dest` and leave the pointer there. Nothing is emitted for a
+    /// variable cell known to be zero already.
+    fn clear_cell(&mut self, dest: usize) {
+        self.move_to(dest);
+        if self.known_values.get(&dest) != Some(&0) {
+            self.emit_clear();
+        }
+    }
+
+    /// Add `value` to the cleared cell `dest`, leaving the pointer there.
+    /// If `scratch` is given it may be clobbered: large values are then
+    /// built with a multiply loop `a[>b<-]` through it, which leaves it zero.
+    fn emit_constant(&mut self, dest: usize, value: usize, scratch: Option<usize>) {
+        let value = value as u8; // Cells wrap at 256
+        let delta = Self::shortest_delta(value);
+        if let Some(scratch) = scratch {
+            let overhead = Self::multiply_overhead(scratch.abs_diff(dest));
+            if let Some((a, b, r)) = Self::multiply_split(value as usize, overhead, delta.unsigned_abs() as usize) {
+                self.move_to(scratch);
+                self.emit_clear();
+                self.emit_add(a as i32);
+                self.emit_instr(Instr::Open);
+                self.move_to(dest);
+                self.emit_add(b as i32);
+                self.move_to(scratch);
+                self.emit("-]");
+                self.move_to(dest);
+                self.emit_add(r as i32);
+                return;
             }
-            
-            // Remove redundant increments/decrements: +- or -+
-            if i + 1 < chars.len() {
-                match (chars[i], chars[i + 1]) {
-                    ('+', '-') | ('-', '+') => {
-                        i += 2; // Skip both characters
-                        continue;
-                    }
-                    _ => {}
+        }
+        self.move_to(dest);
+        self.emit_add(delta);
+    }
+
+    /// Store `bytes` in a freshly allocated buffer and leave a pointer to it
+    /// in the variable's cell (or `dest` for anonymous buffers). A literal
+    /// already in a buffer never gets here: `known_value` gives its pointer,
+    /// which `eval_to_cell` builds as a number.
+    fn eval_bytes(&mut self, bytes: &[u8], dest: usize, variable_name: Option<&str>) {
+        // Always allocate a pointer cell for the variable name
+        let pointer_cell = if let Some(var_name) = variable_name {
+            self.variable_location(var_name)
+        } else {
+            dest
+        };
+        // Allocate buffer data after the pointer, plus one trailing cell the
+        // last byte can use as multiply-loop scratch
+        let data_location = self.allocate(bytes.len() + 1);
+
+        // Store pointer to data in the pointer cell. When the buffer starts
+        // right after it, the first data cell is free to use as scratch.
+        self.clear_cell(pointer_cell);
+        let scratch = (pointer_cell + 1 == data_location).then_some(data_location);
+        self.emit_constant(pointer_cell, data_location, scratch);
+
+        // Fresh cells are zero, except inside a loop, where they still hold
+        // what the previous iteration wrote (the trailing cell is left zero)
+        if self.loop_depth > 0 {
+            for cell in data_location..data_location + bytes.len() {
+                self.move_to(cell);
+                self.emit_clear();
+            }
+        }
+
+        // Write the actual bytes to memory. Either one loop on the trailing cell
+        // seeds all of them and each gets its remainder on the way back, or
+        // each byte is built alone with the next (not yet written) cell of
+        // the buffer as scratch
+        let counter = data_location + bytes.len();
+        let one_by_one: usize = bytes.iter().map(|&byte| Self::constant_cost(byte, 1)).sum();
+        match Self::shared_multiply(bytes) {
+            // Reaching the counter takes one more move each way
+            Some((turns, factors, cost)) if cost + 2 < one_by_one => {
+                self.move_to(counter);
+                self.emit_add(turns as i32);
+                self.emit_instr(Instr::Open);
+                for (i, &m) in factors.iter().enumerate().filter(|&(_, &m)| m > 0) {
+                    self.move_to(data_location + i);
+                    self.emit_add(m as i32);
+                }
+                self.move_to(counter);
+                self.emit("-]");
+                for (i, (&byte, &m)) in bytes.iter().zip(&factors).enumerate().rev() {
+                    self.move_to(data_location + i);
+                    self.emit_add(Self::shortest_delta(byte.wrapping_sub((turns * m) as u8)));
                 }
             }
-            
-            // Remove redundant loops: [][]
-            if i + 3 < chars.len() && chars[i] == '[' && chars[i + 1] == ']' && chars[i + 2] == '[' && chars[i + 3] == ']' {
-                i += 4; // Skip all four characters
-                continue;
+            _ => {
+                for (i, byte) in bytes.iter().enumerate() {
+                    let cell = data_location + i;
+                    self.emit_constant(cell, *byte as usize, Some(cell + 1));
+                }
             }
-            
-            optimized.push(chars[i]);
-            i += 1;
         }
-        
-        optimized
+        self.move_to(pointer_cell); // Leave pointer at the pointer cell
+        self.string_buffers.insert(bytes.to_vec(), data_location);
     }
 
     /// Evaluate an expression, storing its final value in the specified cell.
     /// The pointer will end at the `dest` cell.
     fn eval_to_cell(&mut self, expr: &BFLNode, dest: usize, variable_name: Option<&str>) -> Result<(), String> {
+        // A value known at compile time is built as a literal instead of
+        // being copied or computed by the generated code
+        if let (Some(value), false) = (self.known_value(expr), matches!(expr, BFLNode::Number(_))) {
+            return self.eval_to_cell(&BFLNode::Number(value as i32), dest, variable_name);
+        }
         match expr {
             BFLNode::Number(n) => {
-                self.move_to(dest);
-                self.output.push_str("[-]"); // Clear cell
-                if *n > 0 {
-                    self.output.push_str(&"+".repeat(*n as usize));
+                let value = cell_value(*n);
+                match self.known_values.get(&dest) {
+                    // A variable holding a nearby value is stepped to it
+                    Some(&old) if old != 0 && Self::delta_is_shorter(old, value) => {
+                        self.move_to(dest);
+                        self.emit_add(Self::shortest_delta(value.wrapping_sub(old)));
+                    }
+                    _ => {
+                        self.clear_cell(dest);
+                        // Large values go through a multiply loop on a nearby zero cell
+                        let scratch = self.temp_cell(dest, dest);
+                        self.emit_constant(dest, value as usize, Some(scratch));
+                    }
                 }
             }
             BFLNode::Variable(name) => {
-                let src = *self.variables.get(name).ok_or(format!("Variable '{}' not found", name))?;
+                let src = self.existing_variable(name)?;
                 // Use optimized copy for adjacent cells, fall back to general copy
                 if (src == SCRATCH_1 && dest == SCRATCH_2) || (src == SCRATCH_2 && dest == SCRATCH_1) {
                     // Special case for scratch cells - they're adjacent
@@ -297,118 +676,276 @@ impl BFLCompiler {
                     self.copy_value(src, dest);
                 }
             }
-            BFLNode::String(s) => {
-                self.eval_to_cell(&BFLNode::Bytes(s.as_bytes().to_vec()), dest, variable_name)?;
-            }
-            BFLNode::Bytes(bytes) => {
-                // Always allocate a pointer cell for the variable name
-                let pointer_cell = if let Some(var_name) = variable_name {
-                    *self.variables.entry(var_name.to_string()).or_insert_with(|| {
-                        let loc = self.next_var_location;
-                        self.next_var_location += 1;
-                        loc
-                    })
+            BFLNode::String(s) => self.eval_bytes(s.as_bytes(), dest, variable_name),
+            BFLNode::Bytes(bytes) => self.eval_bytes(bytes, dest, variable_name),
+            BFLNode::Add(lhs, rhs) | BFLNode::Sub(lhs, rhs) => {
+                let negate = matches!(expr, BFLNode::Sub(..));
+                let rhs_is_dest = matches!(rhs.as_ref(), BFLNode::Variable(name) if self.variables.get(name) == Some(&dest));
+                let lhs_is_dest = matches!(lhs.as_ref(), BFLNode::Variable(name) if self.variables.get(name) == Some(&dest));
+                if !self.reads_cell(rhs, dest) || (lhs_is_dest && rhs_is_dest) {
+                    self.eval_to_cell(lhs, dest, variable_name)?; // Evaluate LHS into dest
+                    self.accumulate(rhs, dest, negate, variable_name)?;
+                } else if !negate && rhs_is_dest && !self.reads_cell(lhs, dest) {
+                    // dest already holds the right operand (x = 1 + x)
+                    self.accumulate(lhs, dest, false, variable_name)?;
                 } else {
-                    dest
-                };
-                // Allocate buffer data after the pointer
-                let data_location = self.next_var_location;
-                self.next_var_location += bytes.len();
-
-                // Store pointer to data in the pointer cell
-                self.move_to(pointer_cell);
-                self.output.push_str("[-]");
-                self.output.push_str(&"+".repeat(data_location));
-
-                // Write the actual bytes to memory
-                for (i, byte) in bytes.iter().enumerate() {
-                    self.move_to(data_location + i);
-                    self.output.push_str("[-]");
-                    self.output.push_str(&"+".repeat(*byte as usize));
+                    // Writing the left operand into dest would destroy the
+                    // value the right one still reads, so build it elsewhere
+                    let temp = self.allocate(1);
+                    self.eval_to_cell(expr, temp, variable_name)?;
+                    self.move_to_cell(temp, dest);
+                    self.release(temp, 1);
                 }
-                self.move_to(pointer_cell); // Leave pointer at the pointer cell
             }
-            BFLNode::Add(lhs, rhs) => {
-                self.eval_to_cell(lhs, dest, variable_name)?; // Evaluate LHS into dest
-                self.eval_to_cell(rhs, SCRATCH_1, variable_name)?; // Evaluate RHS into scratch
-                
-                // Add SCRATCH_1 to dest using optimized pattern
-                self.move_to(SCRATCH_1);
-                self.output.push_str("["); // while scratch is not zero
+            _ => return Err(format!("Cannot evaluate this node type directly: {:?}", expr)),
+        }
+        Ok(())
+    }
+
+    /// Add (or with `negate`, subtract) the value of `expr` to the cell at
+    /// `dest` in place. Literals become a `+`/`-` run on `dest` and variables
+    /// are added in a single preserving pass, so neither is materialized in
+    /// a temporary first; nested `Add`/`Sub` operands are flattened. Anything
+    /// else is evaluated into `SCRATCH_1` and drained into `dest`. The pointer
+    /// will end at the `dest` cell.
+    fn accumulate(&mut self, expr: &BFLNode, dest: usize, negate: bool, variable_name: Option<&str>) -> Result<(), String> {
+        let sign = if negate { -1 } else { 1 };
+        match expr {
+            BFLNode::Number(n) => {
                 self.move_to(dest);
-                self.output.push('+'); // dest++
-                self.move_to(SCRATCH_1);
-                self.output.push('-'); // scratch--
-                self.output.push_str("]");
+                self.emit_add(sign * Self::shortest_delta(cell_value(*n)));
+            }
+            BFLNode::Variable(name) if negate && self.variables.get(name) == Some(&dest) => {
+                // Subtracting dest from itself leaves zero, whatever it held
+                self.move_to(dest);
+                self.emit_clear();
+            }
+            BFLNode::Variable(name) => {
+                let src = self.existing_variable(name)?;
+                let temp = self.temp_cell(src, dest);
+                self.move_to(temp);
+                self.emit_clear();
+                if src == dest {
+                    // Move dest out to temp, then add it back twice
+                    self.move_to(dest);
+                    self.emit_instr(Instr::Open);
+                    self.move_to(temp);
+                    self.emit_add(1);
+                    self.move_to(dest);
+                    self.emit("-]");
+                    self.move_to(temp);
+                    self.emit_instr(Instr::Open);
+                    self.move_to(dest);
+                    self.emit_add(2);
+                    self.move_to(temp);
+                    self.emit("-]");
+                } else {
+                    // Drain src into dest and temp, then restore src from temp
+                    self.move_to(src);
+                    self.emit_instr(Instr::Open);
+                    self.move_to(dest);
+                    self.emit_add(sign);
+                    self.move_to(temp);
+                    self.emit_add(1);
+                    self.move_to(src);
+                    self.emit("-]");
+                    self.move_to(temp);
+                    self.emit_instr(Instr::Open);
+                    self.move_to(src);
+                    self.emit_add(1);
+                    self.move_to(temp);
+                    self.emit("-]");
+                }
                 self.move_to(dest);
             }
+            BFLNode::Add(lhs, rhs) => {
+                self.accumulate(lhs, dest, negate, variable_name)?;
+                self.accumulate(rhs, dest, negate, variable_name)?;
+            }
             BFLNode::Sub(lhs, rhs) => {
-                self.eval_to_cell(lhs, dest, variable_name)?; // Evaluate LHS into dest
-                self.eval_to_cell(rhs, SCRATCH_1, variable_name)?; // Evaluate RHS into scratch
-                
-                // Subtract SCRATCH_1 from dest (clamping at 0)
+                self.accumulate(lhs, dest, negate, variable_name)?;
+                self.accumulate(rhs, dest, !negate, variable_name)?;
+            }
+            _ => {
+                self.eval_to_cell(expr, SCRATCH_1, variable_name)?; // Evaluate into scratch
                 self.move_to(SCRATCH_1);
-                self.output.push_str("["); // while scratch is not zero
+                self.emit_instr(Instr::Open); // while scratch is not zero
                 self.move_to(dest);
-                self.output.push('-'); // dest--
+                self.emit_add(sign);
                 self.move_to(SCRATCH_1);
-                self.output.push('-'); // scratch--
-                self.output.push_str("]");
+                self.emit_add(-1); // scratch--
+                self.emit_instr(Instr::Close);
                 self.move_to(dest);
             }
-            _ => return Err(format!("Cannot evaluate this node type directly: {:?}", expr)),
         }
         Ok(())
     }
 
+    /// Drop what is known about the syscall cells and literal buffers, at a
+    /// point that can be reached with more than one history (or none).
+    fn forget_known_state(&mut self) {
+        self.syscall_cells = [None; 8];
+        self.string_buffers.clear();
+        self.known_values.clear();
+    }
+
+    /// The value `expr` is known to leave in a cell at this point, if any:
+    /// a literal, a variable of known value, or a sum or difference of them.
+    /// A string or byte literal already in a buffer leaves the pointer to it.
+    fn known_value(&self, expr: &BFLNode) -> Option<u8> {
+        match expr {
+            BFLNode::Number(n) => Some(cell_value(*n)),
+            BFLNode::String(s) => self.string_buffers.get(s.as_bytes()).map(|&data| data as u8),
+            BFLNode::Bytes(bytes) => self.string_buffers.get(bytes).map(|&data| data as u8),
+            BFLNode::Variable(name) => self.known_values.get(self.variables.get(name)?).copied(),
+            BFLNode::Add(lhs, rhs) => Some(self.known_value(lhs)?.wrapping_add(self.known_value(rhs)?)),
+            BFLNode::Sub(lhs, rhs) => Some(self.known_value(lhs)?.wrapping_sub(self.known_value(rhs)?)),
+            _ => None,
+        }
+    }
+
+    /// Whether evaluating `expr` reads the variable held in `cell`.
+    fn reads_cell(&self, expr: &BFLNode, cell: usize) -> bool {
+        match expr {
+            BFLNode::Variable(name) => self.variables.get(name) == Some(&cell),
+            BFLNode::Add(lhs, rhs) | BFLNode::Sub(lhs, rhs) => {
+                self.reads_cell(lhs, cell) || self.reads_cell(rhs, cell)
+            }
+            _ => false,
+        }
+    }
+
+    /// Allocate the variables assigned in a body that is never compiled, so
+    /// later references still find them (holding zero, as nothing wrote them).
+    fn declare_variables(&mut self, body: &[BFLNode]) {
+        for stmt in body {
+            match stmt {
+                BFLNode::Assign(name, _) => {
+                    self.variable_location(name);
+                }
+                BFLNode::If(_, body) | BFLNode::While(_, body) | BFLNode::Block(body) => {
+                    self.declare_variables(body)
+                }
+                _ => {}
+            }
+        }
+    }
+
+    /// Evaluate a syscall number or argument into its cell. A known value
+    /// the cell already holds is left alone, and one close to the cell's
+    /// value is reached by adding the difference instead of reloading.
+    fn load_syscall_cell(&mut self, cell: usize, expr: &BFLNode) -> Result<(), String> {
+        let literal = self.known_value(expr);
+        match (self.syscall_cells[cell], literal) {
+            (Some(old), Some(new)) if old == new => {}
+            (Some(old), Some(new)) if Self::delta_is_shorter(old, new) => {
+                self.move_to(cell);
+                self.emit_add(Self::shortest_delta(new.wrapping_sub(old)));
+            }
+            _ => self.eval_to_cell(expr, cell, None)?,
+        }
+        self.syscall_cells[cell] = literal;
+        Ok(())
+    }
+
     pub fn compile(&mut self, node: &BFLNode) -> Result<(), String> {
+        let folded = fold(node);
+        self.compile_node(&folded)
+    }
+
+    fn compile_node(&mut self, node: &BFLNode) -> Result<(), String> {
         match node {
             BFLNode::Block(statements) => {
                 for stmt in statements {
-                    self.compile(stmt)?;
+                    self.compile_node(stmt)?;
                 }
             }
             BFLNode::Assign(name, expr) => {
-                let location = *self.variables.entry(name.clone()).or_insert_with(|| {
-                    let loc = self.next_var_location;
-                    self.next_var_location += 1;
-                    loc
-                });
+                let value = self.known_value(expr);
+                let location = self.variable_location(name);
                 self.eval_to_cell(expr, location, Some(name))?;
+                // A new literal's buffer, and so its pointer, is only known
+                // once it has been written
+                match value.or_else(|| self.known_value(expr)) {
+                    Some(value) => self.known_values.insert(location, value),
+                    None => self.known_values.remove(&location),
+                };
+            }
+            BFLNode::While(condition, body) if self.known_value(condition) == Some(0) => {
+                self.declare_variables(body); // Never entered
             }
             BFLNode::While(condition, body) => {
-                let cond_loc = SCRATCH_2;
-                self.eval_to_cell(condition, cond_loc, None)?; // Initial condition check
+                // A variable condition is tested on the variable's own cell:
+                // it already holds the value to test on every iteration, so
+                // there is nothing to copy or re-evaluate
+                let in_place = match condition.as_ref() {
+                    BFLNode::Variable(name) => {
+                        Some(self.existing_variable(name)?)
+                    }
+                    _ => None,
+                };
+                // Otherwise it goes in a cell next to the variables, which
+                // the loop leaves zero
+                let cond_loc = in_place.unwrap_or_else(|| self.allocate(1));
+                if in_place.is_none() {
+                    self.eval_to_cell(condition, cond_loc, None)?; // Initial condition check
+                }
                 self.move_to(cond_loc);
-                self.output.push('['); // Loop while condition is non-zero
+                self.emit_instr(Instr::Open); // Loop while condition is non-zero
+                self.forget_known_state(); // Reached from the loop's end too
                 
+                self.loop_depth += 1;
                 for stmt in body {
-                    self.compile(stmt)?;
+                    self.compile_node(stmt)?;
                 }
+                self.loop_depth -= 1;
                 
-                // Always use non-destructive copy for condition re-evaluation
-                self.eval_to_cell(condition, cond_loc, None)?;
+                if in_place.is_none() {
+                    self.eval_to_cell(condition, cond_loc, None)?; // Re-evaluate for the next iteration
+                }
                 self.move_to(cond_loc);
-                self.output.push(']');
+                self.emit_instr(Instr::Close);
+                self.forget_known_state();
+                match in_place {
+                    Some(location) => {
+                        self.known_values.insert(location, 0); // How the loop ends
+                    }
+                    None => self.release(cond_loc, 1),
+                }
+            }
+            BFLNode::If(condition, body) if self.known_value(condition).is_some() => {
+                // Decided at compile time: the body runs unconditionally or
+                // not at all
+                if self.known_value(condition) == Some(0) {
+                    self.declare_variables(body);
+                } else {
+                    for stmt in body {
+                        self.compile_node(stmt)?;
+                    }
+                }
             }
             BFLNode::If(condition, body) => {
-                let cond_loc = SCRATCH_2;
+                // The flag lives next to the variables, not out in the
+                // scratch area, and is free again once cleared
+                let cond_loc = self.allocate(1);
                 self.eval_to_cell(condition, cond_loc, None)?;
                 self.move_to(cond_loc);
-                self.output.push('['); // If condition is non-zero
+                self.emit_instr(Instr::Open); // If condition is non-zero
                 
                 for stmt in body {
-                    self.compile(stmt)?;
+                    self.compile_node(stmt)?;
                 }
                 
                 // Clear the flag to ensure the 'if' block runs only once
                 self.move_to(cond_loc);
-                self.output.push_str("[-]");
-                self.output.push(']');
+                self.emit_clear();
+                self.emit_instr(Instr::Close);
+                self.release(cond_loc, 1);
+                self.forget_known_state(); // The body may or may not have run
             }
             BFLNode::Syscall(syscall_no, args) => {
                 // Evaluate syscall number into cell 7
-                self.eval_to_cell(syscall_no, 7, None)?;
+                self.load_syscall_cell(7, syscall_no)?;
 
                 // Evaluate arguments into cells 1-6
                 for (i, arg) in args.iter().enumerate() {
@@ -416,11 +953,19 @@ impl BFLCompiler {
                         return Err("Too many syscall arguments (max 6)".to_string());
                     }
                     let arg_cell = i + 1;
-                    self.eval_to_cell(arg, arg_cell, None)?;
+                    self.load_syscall_cell(arg_cell, arg)?;
                 }
 
                 // Execute syscall
-                self.output.push('.');
+                self.emit_instr(Instr::Output);
+
+                // The result lands in cell 0, and anything but write(2) may
+                // store through a pointer argument
+                self.known_values.remove(&0);
+                if !matches!(syscall_no.as_ref(), BFLNode::Number(n) if *n == SYS_WRITE) {
+                    self.string_buffers.clear();
+                    self.known_values.clear();
+                }
             }
             // Expressions are handled by `eval_to_cell` and shouldn't be top-level statements
             _ => return Err(format!("Node type {:?} cannot be a top-level statement", node)),
@@ -429,12 +974,13 @@ impl BFLCompiler {
     }
 
     pub fn get_output(&self) -> &str {
-        &self.output
+        self.rendered
+            .get_or_init(|| Self::render(&self.output))
     }
 
     pub fn get_optimized_output(&mut self) -> &str {
         self.optimize_output();
-        &self.output
+        self.get_output()
     }
 
     pub fn get_variable_address(&self, name: &str) -> Option<usize> {
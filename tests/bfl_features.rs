@@ -240,4 +240,508 @@ fn test_bfl_network_socket() {
     let mut bf = BF::new(bf_code, Mode::BFA);
     let _ = bf.run();
     // No assert: just check that no panic occurs
-} 
\ No newline at end of file
+}
+
+#[test]
+fn test_bfl_optimized_output_preserves_values() {
+    // The optimized output must compute the same values as the plain output
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("x".to_string(), Box::new(BFLNode::Number(42))),
+        BFLNode::Assign("y".to_string(), Box::new(BFLNode::Add(
+            Box::new(BFLNode::Variable("x".to_string())),
+            Box::new(BFLNode::Number(8)),
+        ))),
+    ]);
+    compiler.compile(&program).unwrap();
+    let plain_len = compiler.get_output().len();
+    let bf_code = compiler.get_optimized_output().to_string();
+    assert!(bf_code.len() <= plain_len);
+    let mut bf = BF::new(&bf_code, Mode::BFA);
+    bf.run().unwrap();
+    let x_addr = compiler.get_variable_address("x").unwrap();
+    let y_addr = compiler.get_variable_address("y").unwrap();
+    assert_eq!(bf.dump_cells(x_addr + 1)[x_addr], 42);
+    assert_eq!(bf.dump_cells(y_addr + 1)[y_addr], 50);
+}
+
+#[test]
+fn test_bfl_long_string_does_not_overlap_scratch() {
+    // A buffer large enough to reach the scratch cells must be placed past them
+    let text = "x".repeat(120);
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("msg".to_string(), Box::new(BFLNode::String(text.clone()))),
+        BFLNode::Assign("a".to_string(), Box::new(BFLNode::Number(5))),
+        BFLNode::Assign("b".to_string(), Box::new(BFLNode::Variable("a".to_string()))),
+    ]);
+    compiler.compile(&program).unwrap();
+    let bf_code = compiler.get_output();
+    let mut bf = BF::new(bf_code, Mode::BFA);
+    bf.run().unwrap();
+    let msg_addr = compiler.get_variable_address("msg").unwrap();
+    let data = bf.dump_cells(msg_addr + 1)[msg_addr] as usize;
+    let cells = bf.dump_cells(data + text.len());
+    assert_eq!(&cells[data..], text.as_bytes());
+    let b_addr = compiler.get_variable_address("b").unwrap();
+    assert_eq!(bf.dump_cells(b_addr + 1)[b_addr], 5);
+}
+
+#[test]
+fn test_bfl_constant_folding() {
+    // Constant arithmetic compiles to the same code as the literal result
+    let compile = |expr: BFLNode| {
+        let mut compiler = BFLCompiler::new();
+        compiler.compile(&BFLNode::Assign("r".to_string(), Box::new(expr))).unwrap();
+        compiler.get_output().to_string()
+    };
+    let folded = compile(BFLNode::Add(
+        Box::new(BFLNode::Number(3)),
+        Box::new(BFLNode::Sub(Box::new(BFLNode::Number(10)), Box::new(BFLNode::Number(6)))),
+    ));
+    assert_eq!(folded, compile(BFLNode::Number(7)));
+
+    // Folding wraps like the cells do at runtime
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Assign("r".to_string(), Box::new(BFLNode::Sub(
+        Box::new(BFLNode::Number(3)),
+        Box::new(BFLNode::Number(5)),
+    )));
+    compiler.compile(&program).unwrap();
+    let mut bf = BF::new(compiler.get_output(), Mode::BFA);
+    bf.run().unwrap();
+    let r_addr = compiler.get_variable_address("r").unwrap();
+    assert_eq!(bf.dump_cells(r_addr + 1)[r_addr], 254);
+}
+
+#[test]
+fn test_bfl_variable_operands_are_preserved() {
+    let var = |name: &str| Box::new(BFLNode::Variable(name.to_string()));
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        // Set inside a block that always runs, but that the compiler can't
+        // see through, so the operands are only known at runtime
+        BFLNode::If(Box::new(BFLNode::Add(var("_syscall_result"), Box::new(BFLNode::Number(1)))), vec![
+            BFLNode::Assign("a".to_string(), Box::new(BFLNode::Number(30))),
+            BFLNode::Assign("b".to_string(), Box::new(BFLNode::Number(12))),
+        ]),
+        BFLNode::Assign("sum".to_string(), Box::new(BFLNode::Add(var("a"), var("b")))),
+        BFLNode::Assign("diff".to_string(), Box::new(BFLNode::Sub(var("a"), var("b")))),
+        // a + (5 + b) - (b - 1)
+        BFLNode::Assign(
+            "nested".to_string(),
+            Box::new(BFLNode::Sub(
+                Box::new(BFLNode::Add(
+                    var("a"),
+                    Box::new(BFLNode::Add(Box::new(BFLNode::Number(5)), var("b"))),
+                )),
+                Box::new(BFLNode::Sub(var("b"), Box::new(BFLNode::Number(1)))),
+            )),
+        ),
+        BFLNode::Assign("b".to_string(), Box::new(BFLNode::Add(var("b"), var("b")))),
+    ]);
+    compiler.compile(&program).unwrap();
+    let mut bf = BF::new(compiler.get_output(), Mode::BFA);
+    bf.run().unwrap();
+    let cells = bf.dump_cells(128);
+    let value = |name: &str| cells[compiler.get_variable_address(name).unwrap()];
+    assert_eq!(value("a"), 30);
+    assert_eq!(value("sum"), 42);
+    assert_eq!(value("diff"), 18);
+    assert_eq!(value("nested"), 36);
+    assert_eq!(value("b"), 24);
+}
+
+#[test]
+fn test_bfl_repeated_syscall_reuses_loaded_arguments() {
+    // close(0), compiled but never run
+    let close = || BFLNode::Syscall(Box::new(BFLNode::Number(3)), vec![BFLNode::Number(0)]);
+    let compile = |program: BFLNode| {
+        let mut compiler = BFLCompiler::new();
+        compiler.compile(&program).unwrap();
+        compiler.get_output().to_string()
+    };
+    let once = compile(BFLNode::Block(vec![close()]));
+    let twice = compile(BFLNode::Block(vec![close(), close()]));
+    // The second call only needs to issue the syscall again
+    assert_eq!(twice, format!("{}.", once));
+    // ...but it is reloaded after a block that may have changed the cells
+    let guarded = compile(BFLNode::Block(vec![
+        close(),
+        BFLNode::If(Box::new(BFLNode::Variable("_syscall_result".to_string())), vec![close()]),
+        close(),
+    ]));
+    assert_eq!(guarded.matches("[-]+++").count(), 2, "{}", guarded);
+    // A nearby syscall number is reached from the one already loaded
+    let nearby = BFLNode::Syscall(Box::new(BFLNode::Number(5)), vec![BFLNode::Number(0)]);
+    let adjusted = compile(BFLNode::Block(vec![close(), nearby]));
+    assert_eq!(adjusted, format!("{}>>>>>>++.", once));
+}
+
+#[test]
+fn test_bfl_large_constants_count_down() {
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("x".to_string(), Box::new(BFLNode::Number(255))),
+        BFLNode::Assign(
+            "y".to_string(),
+            Box::new(BFLNode::Sub(
+                Box::new(BFLNode::Variable("x".to_string())),
+                Box::new(BFLNode::Number(250)),
+            )),
+        ),
+    ]);
+    compiler.compile(&program).unwrap();
+    let bf_code = compiler.get_output();
+    // Both constants are reached by counting down from zero
+    let arithmetic = bf_code.chars().filter(|c| *c == '+' || *c == '-').count();
+    assert!(arithmetic < 20, "{}", bf_code);
+    let mut bf = BF::new(bf_code, Mode::BFA);
+    bf.run().unwrap();
+    let cells = bf.dump_cells(16);
+    assert_eq!(cells[compiler.get_variable_address("x").unwrap()], 255);
+    assert_eq!(cells[compiler.get_variable_address("y").unwrap()], 5);
+}
+
+#[test]
+fn test_bfl_copy_uses_nearby_temp_cell() {
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("a".to_string(), Box::new(BFLNode::Number(5))),
+        // Forget that a is 5, so it has to be copied at runtime
+        BFLNode::If(Box::new(BFLNode::Variable("_syscall_result".to_string())), vec![]),
+    ]);
+    compiler.compile(&program).unwrap();
+    let setup = compiler.get_output().len();
+    compiler.compile(&BFLNode::Assign("b".to_string(), Box::new(BFLNode::Variable("a".to_string())))).unwrap();
+    let bf_code = compiler.get_output();
+    // The copy goes through the cell after `b`, not the scratch area at 100
+    assert!(bf_code.len() - setup < 50, "{}", &bf_code[setup..]);
+    let mut bf = BF::new(bf_code, Mode::BFA);
+    bf.run().unwrap();
+    assert_eq!(bf.dump_cells(12), &[0, 0, 0, 0, 0, 0, 0, 0, 5, 5, 0, 0]);
+}
+
+#[test]
+fn test_bfl_overwritten_assignment_is_dropped() {
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("x".to_string(), Box::new(BFLNode::Number(5))),
+        BFLNode::Assign("x".to_string(), Box::new(BFLNode::Number(7))),
+    ]);
+    compiler.compile(&program).unwrap();
+    assert_eq!(compiler.get_output(), format!("{}+++++++", ">".repeat(8)));
+}
+
+#[test]
+fn test_bfl_repeated_string_literal_shares_buffer() {
+    let hi = || Box::new(BFLNode::String("hi".to_string()));
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("a".to_string(), hi()),
+        BFLNode::Assign("b".to_string(), hi()),
+        // Neither this body nor its buffer is ever reached...
+        BFLNode::If(Box::new(BFLNode::Number(0)), vec![
+            BFLNode::Assign("a".to_string(), Box::new(BFLNode::String("no".to_string()))),
+            BFLNode::Assign("c".to_string(), Box::new(BFLNode::String("no".to_string()))),
+        ]),
+        // ...so this has to write its own copy
+        BFLNode::Assign("d".to_string(), Box::new(BFLNode::String("no".to_string()))),
+    ]);
+    compiler.compile(&program).unwrap();
+    let mut bf = BF::new(compiler.get_output(), Mode::BFA);
+    bf.run().unwrap();
+    let cells = bf.dump_cells(64);
+    let pointer = |name: &str| cells[compiler.get_variable_address(name).unwrap()] as usize;
+    assert_eq!(pointer("a"), pointer("b"));
+    assert_eq!(&cells[pointer("a")..pointer("a") + 2], b"hi");
+    assert_eq!(&cells[pointer("d")..pointer("d") + 2], b"no");
+}
+
+#[test]
+fn test_bfl_countdown_loops_compile_to_idioms() {
+    let var = |name: &str| Box::new(BFLNode::Variable(name.to_string()));
+    let step = |name: &str, op: fn(Box<BFLNode>, Box<BFLNode>) -> BFLNode| {
+        BFLNode::Assign(name.to_string(), Box::new(op(var(name), Box::new(BFLNode::Number(1)))))
+    };
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("x".to_string(), Box::new(BFLNode::Number(3))),
+        BFLNode::Assign("y".to_string(), Box::new(BFLNode::Number(0))),
+        // Moves x into y...
+        BFLNode::While(var("x"), vec![step("y", BFLNode::Add), step("x", BFLNode::Sub)]),
+        // ...and counts y back down to zero
+        BFLNode::While(var("y"), vec![step("y", BFLNode::Sub)]),
+    ]);
+    compiler.compile(&program).unwrap();
+    let bf_code = compiler.get_output();
+    assert!(bf_code.ends_with("[>+<-]>[-]"), "{}", bf_code);
+}
+
+#[test]
+fn test_bfl_known_conditions_are_decided_at_compile_time() {
+    let var = |name: &str| Box::new(BFLNode::Variable(name.to_string()));
+    let num = |n: i32| Box::new(BFLNode::Number(n));
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("y".to_string(), num(3)),
+        BFLNode::While(var("y"), vec![BFLNode::Assign("y".to_string(), Box::new(BFLNode::Sub(var("y"), num(1))))]),
+        // y is zero once the loop ends, so the first body is dropped and
+        // the second runs without a flag
+        BFLNode::If(var("y"), vec![BFLNode::Assign("w".to_string(), num(5))]),
+        BFLNode::If(Box::new(BFLNode::Sub(num(1), var("y"))), vec![BFLNode::Assign("z".to_string(), num(7))]),
+    ]);
+    compiler.compile(&program).unwrap();
+    assert_eq!(compiler.get_output(), format!("{}+++[-]>>+++++++", ">".repeat(8)));
+    assert_eq!(compiler.get_variable_address("w"), Some(9));
+}
+
+#[test]
+fn test_bfl_loop_on_zero_cell_is_dropped() {
+    let result = || Box::new(BFLNode::Variable("_syscall_result".to_string()));
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        // Nothing has run yet, so cell 0 is still zero
+        BFLNode::While(result(), vec![BFLNode::Assign("x".to_string(), Box::new(BFLNode::Number(1)))]),
+        BFLNode::Assign("y".to_string(), Box::new(BFLNode::Number(2))),
+    ]);
+    compiler.compile(&program).unwrap();
+    assert_eq!(compiler.get_output(), format!("{}++", ">".repeat(9)));
+}
+
+#[test]
+fn test_bfl_condition_cells_sit_next_to_variables() {
+    let var = |name: &str| Box::new(BFLNode::Variable(name.to_string()));
+    let num = |n: i32| Box::new(BFLNode::Number(n));
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("x".to_string(), num(5)),
+        BFLNode::If(var("_syscall_result"), vec![BFLNode::Assign("x".to_string(), num(3))]),
+        BFLNode::While(Box::new(BFLNode::Sub(var("x"), num(2))), vec![
+            BFLNode::Assign("x".to_string(), Box::new(BFLNode::Sub(var("x"), num(1)))),
+        ]),
+        BFLNode::Assign("z".to_string(), num(1)),
+    ]);
+    compiler.compile(&program).unwrap();
+    let bf_code = compiler.get_output();
+    // No trips out to the scratch area at cell 100
+    assert!(bf_code.len() < 200, "{}", bf_code);
+    // Both condition cells were given back once their statements ended
+    assert_eq!(compiler.get_variable_address("z"), Some(9));
+    let mut bf = BF::new(bf_code, Mode::BFA);
+    bf.run().unwrap();
+    assert_eq!(bf.dump_cells(10), &[0, 0, 0, 0, 0, 0, 0, 0, 2, 1]);
+}
+
+#[test]
+fn test_bfl_known_values_are_built_as_literals() {
+    let var = |name: &str| Box::new(BFLNode::Variable(name.to_string()));
+    let compile = |value: BFLNode| {
+        let mut compiler = BFLCompiler::new();
+        let program = BFLNode::Block(vec![
+            BFLNode::Assign("a".to_string(), Box::new(BFLNode::Number(30))),
+            BFLNode::Assign("b".to_string(), Box::new(value)),
+        ]);
+        compiler.compile(&program).unwrap();
+        compiler.get_output().to_string()
+    };
+    // a is known to be 30, so no copy loops are needed
+    assert_eq!(compile(BFLNode::Add(var("a"), var("a"))), compile(BFLNode::Number(60)));
+}
+
+#[test]
+fn test_bfl_string_pointer_is_passed_as_literal() {
+    let compile = |buffer: BFLNode| {
+        let mut compiler = BFLCompiler::new();
+        let program = BFLNode::Block(vec![
+            BFLNode::Assign("msg".to_string(), Box::new(BFLNode::String("hi".to_string()))),
+            BFLNode::Syscall(Box::new(BFLNode::Number(1)), vec![BFLNode::Number(1), buffer, BFLNode::Number(2)]),
+        ]);
+        compiler.compile(&program).unwrap();
+        assert_eq!(compiler.get_variable_address("msg"), Some(8));
+        compiler.get_output().to_string()
+    };
+    // The buffer follows the pointer cell, so msg is known to hold 9
+    assert_eq!(compile(BFLNode::Variable("msg".to_string())), compile(BFLNode::Number(9)));
+}
+
+#[test]
+fn test_bfl_string_bytes_share_one_multiply_loop() {
+    let mut bytes = b"Hello, World from BFL!\n".to_vec();
+    bytes.extend([0, 200, 255]);
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("msg".to_string(), Box::new(BFLNode::Bytes(bytes.clone()))),
+    ]);
+    compiler.compile(&program).unwrap();
+    let bf_code = compiler.get_output().to_string();
+    let mut bf = BF::new(&bf_code, Mode::BFA);
+    bf.run().unwrap();
+    let msg_addr = compiler.get_variable_address("msg").unwrap();
+    let data = bf.dump_cells(msg_addr + 1)[msg_addr] as usize;
+    let cells = bf.dump_cells(data + bytes.len() + 1);
+    assert_eq!(&cells[data..data + bytes.len()], &bytes[..]);
+    // The counter loop leaves the trailing cell zero
+    assert_eq!(cells[data + bytes.len()], 0);
+    // Seeding all bytes from one loop beats a loop per byte
+    assert_eq!(bf_code.matches('[').count(), 1, "{}", bf_code);
+    assert!(bf_code.len() < 400, "{} commands: {}", bf_code.len(), bf_code);
+}
+
+#[test]
+fn test_bfl_variable_first_assigned_in_loop_is_reset_each_iteration() {
+    let var = |name: &str| Box::new(BFLNode::Variable(name.to_string()));
+    let num = |n: i32| Box::new(BFLNode::Number(n));
+    let countdown = || BFLNode::Assign("i".to_string(), Box::new(BFLNode::Sub(var("i"), num(1))));
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("d".to_string(), num(5)),
+        BFLNode::Assign("i".to_string(), num(3)),
+        // x and c start out zero, but not on the second and third passes
+        BFLNode::While(var("i"), vec![
+            BFLNode::Assign("x".to_string(), num(5)),
+            BFLNode::Assign("c".to_string(), var("d")),
+            countdown(),
+        ]),
+    ]);
+    compiler.compile(&program).unwrap();
+    let bf_code = compiler.get_output();
+    let mut bf = BF::new(bf_code, Mode::BFA);
+    bf.run().unwrap();
+    let cells = bf.dump_cells(20);
+    for (name, expected) in [("x", 5), ("c", 5), ("d", 5), ("i", 0)] {
+        let addr = compiler.get_variable_address(name).unwrap();
+        assert_eq!(cells[addr], expected, "{} in {}", name, bf_code);
+    }
+}
+
+#[test]
+fn test_bfl_string_assigned_in_loop_is_rewritten_each_iteration() {
+    let var = |name: &str| Box::new(BFLNode::Variable(name.to_string()));
+    let num = |n: i32| Box::new(BFLNode::Number(n));
+    for text in ["AB", "Hello, World from BFL!\n"] {
+        let mut compiler = BFLCompiler::new();
+        let program = BFLNode::Block(vec![
+            BFLNode::Assign("i".to_string(), num(2)),
+            BFLNode::While(var("i"), vec![
+                BFLNode::Assign("m".to_string(), Box::new(BFLNode::String(text.to_string()))),
+                BFLNode::Assign("i".to_string(), Box::new(BFLNode::Sub(var("i"), num(1)))),
+            ]),
+        ]);
+        compiler.compile(&program).unwrap();
+        let bf_code = compiler.get_output();
+        let mut bf = BF::new(bf_code, Mode::BFA);
+        bf.run().unwrap();
+        let m_addr = compiler.get_variable_address("m").unwrap();
+        let data = bf.dump_cells(m_addr + 1)[m_addr] as usize;
+        let cells = bf.dump_cells(data + text.len() + 1);
+        assert_eq!(&cells[data..data + text.len()], text.as_bytes(), "{}", bf_code);
+        assert_eq!(cells[data + text.len()], 0);
+    }
+}
+
+#[test]
+fn test_bfl_variable_minus_itself_leaves_no_residue() {
+    let var = |name: &str| Box::new(BFLNode::Variable(name.to_string()));
+    let mut compiler = BFLCompiler::new();
+    let program = BFLNode::Block(vec![
+        // Only known at runtime, so x - x is left to the generated code
+        BFLNode::Assign("x".to_string(), Box::new(BFLNode::Add(var("_syscall_result"), Box::new(BFLNode::Number(5))))),
+        BFLNode::Assign("x".to_string(), Box::new(BFLNode::Sub(var("x"), var("x")))),
+        BFLNode::Assign("y".to_string(), Box::new(BFLNode::Number(1))),
+    ]);
+    compiler.compile(&program).unwrap();
+    let bf_code = compiler.get_output();
+    let mut bf = BF::new(bf_code, Mode::BFA);
+    bf.run().unwrap();
+    let cells = bf.dump_cells(128);
+    let value = |name: &str| cells[compiler.get_variable_address(name).unwrap()];
+    assert_eq!(value("x"), 0, "{}", bf_code);
+    assert_eq!(value("y"), 1, "{}", bf_code);
+    // Nothing is left behind in the cells past the variables
+    assert!(cells[10..100].iter().all(|&cell| cell == 0), "{}", bf_code);
+}
+
+#[test]
+fn test_bfl_variable_allocated_after_copy_in_loop_survives() {
+    let var = |name: &str| Box::new(BFLNode::Variable(name.to_string()));
+    let num = |n: i32| Box::new(BFLNode::Number(n));
+    let mut compiler = BFLCompiler::new();
+    // The copy into t must not use the cell y is given afterwards
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("x".to_string(), Box::new(BFLNode::Add(var("_syscall_result"), num(5)))),
+        BFLNode::Assign("c".to_string(), num(2)),
+        BFLNode::While(var("c"), vec![
+            BFLNode::Assign("t".to_string(), var("x")),
+            BFLNode::Assign("y".to_string(), Box::new(BFLNode::Add(var("y"), num(1)))),
+            BFLNode::Assign("c".to_string(), Box::new(BFLNode::Sub(var("c"), num(1)))),
+        ]),
+    ]);
+    compiler.compile(&program).unwrap();
+    let bf_code = compiler.get_output();
+    let mut bf = BF::new(bf_code, Mode::BFA);
+    bf.run().unwrap();
+    let cells = bf.dump_cells(20);
+    for (name, expected) in [("x", 5), ("t", 5), ("y", 2), ("c", 0)] {
+        let addr = compiler.get_variable_address(name).unwrap();
+        assert_eq!(cells[addr], expected, "{} in {}", name, bf_code);
+    }
+}
+
+#[test]
+fn test_bfl_variable_allocated_after_if_in_loop_survives() {
+    let var = |name: &str| Box::new(BFLNode::Variable(name.to_string()));
+    let num = |n: i32| Box::new(BFLNode::Number(n));
+    let mut compiler = BFLCompiler::new();
+    // The If flag must not be handed to y and then set again on the next pass
+    let program = BFLNode::Block(vec![
+        BFLNode::Assign("x".to_string(), Box::new(BFLNode::Add(var("_syscall_result"), num(5)))),
+        BFLNode::Assign("c".to_string(), num(2)),
+        BFLNode::While(var("c"), vec![
+            BFLNode::If(var("x"), vec![]),
+            BFLNode::Assign("y".to_string(), Box::new(BFLNode::Add(var("y"), num(1)))),
+            BFLNode::Assign("c".to_string(), Box::new(BFLNode::Sub(var("c"), num(1)))),
+        ]),
+    ]);
+    compiler.compile(&program).unwrap();
+    let bf_code = compiler.get_output();
+    let mut bf = BF::new(bf_code, Mode::BFA);
+    bf.run().unwrap();
+    let cells = bf.dump_cells(20);
+    for (name, expected) in [("x", 5), ("y", 2), ("c", 0)] {
+        let addr = compiler.get_variable_address(name).unwrap();
+        assert_eq!(cells[addr], expected, "{} in {}", name, bf_code);
+    }
+}
+
+#[test]
+fn test_bfl_assignment_reading_its_target_on_the_right() {
+    let var = || Box::new(BFLNode::Variable("x".to_string()));
+    let num = |n: i32| Box::new(BFLNode::Number(n));
+    let add = |lhs, rhs| Box::new(BFLNode::Add(lhs, rhs));
+    let sub = |lhs, rhs| Box::new(BFLNode::Sub(lhs, rhs));
+    let cases: Vec<(Box<BFLNode>, fn(u8) -> u8)> = vec![
+        (add(num(1), var()), |x| 1u8.wrapping_add(x)),
+        (sub(num(1), var()), |x| 1u8.wrapping_sub(x)),
+        (add(var(), var()), |x| x.wrapping_mul(2)),
+        (add(var(), add(num(1), var())), |x| x.wrapping_mul(2).wrapping_add(1)),
+        (add(add(var(), num(1)), var()), |x| x.wrapping_mul(2).wrapping_add(1)),
+        (sub(num(10), add(var(), var())), |x| 10u8.wrapping_sub(x.wrapping_mul(2))),
+    ];
+    for (expr, expected) in cases {
+        // x = 3 is known at compile time, x = _syscall_result + 3 is not
+        for start in [num(3), add(Box::new(BFLNode::Variable("_syscall_result".to_string())), num(3))] {
+            let mut compiler = BFLCompiler::new();
+            let program = BFLNode::Block(vec![
+                BFLNode::Assign("x".to_string(), start),
+                BFLNode::Assign("x".to_string(), expr.clone()),
+            ]);
+            compiler.compile(&program).unwrap();
+            let bf_code = compiler.get_output();
+            let mut bf = BF::new(bf_code, Mode::BFA);
+            bf.run().unwrap();
+            let addr = compiler.get_variable_address("x").unwrap();
+            assert_eq!(bf.dump_cells(addr + 1)[addr], expected(3), "{:?} in {}", expr, bf_code);
+        }
+    }
+}